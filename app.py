@@ -1,10 +1,24 @@
 import streamlit as st
 import pandas as pd
 import os
-from utils.pdf_reader import read_text_from_file
-from utils.ai_extractor import extract_red_flags
-from utils.coverage_mapper import assess_coverage
-from utils.web_scraper import fetch_fatf_reports, download_and_extract_pdf_text
+import time
+import hashlib
+import tempfile
+from utils.job_queue import submit_ingestion_job, get_job, list_jobs, load_job_result
+from utils.web_scraper import fetch_fatf_reports
+
+POLL_INTERVAL_SECONDS = 1.0
+FATF_CACHE_TTL_SECONDS = 3600
+UPLOAD_TYPES = ["txt", "pdf", "docx", "xlsx", "xls", "html", "htm"]
+EXTRACTOR_CHOICES = ["gpt", "local", "keyword"]
+# Read here rather than from ai_extractor so the UI doesn't import the extractors
+DEFAULT_EXTRACTOR = os.getenv("EXTRACTOR_BACKEND") or "gpt"
+
+
+@st.cache_data(ttl=FATF_CACHE_TTL_SECONDS, show_spinner=False)
+def cached_fatf_reports(limit=10):
+    # The script reruns every poll interval while a job runs; don't hit FATF each time
+    return fetch_fatf_reports(limit=limit)
 
 st.set_page_config(page_title="AI FCRM - TM Coverage (Ingestion)", layout="wide")
 
@@ -12,32 +26,65 @@ st.title("🧠 AI Powered FCRM - TM Coverage (Ingestion)")
 
 st.sidebar.header("Data Ingestion")
 source_type = st.sidebar.selectbox("Source", ["Upload local file", "Fetch from FATF website"])
-use_gpt = st.sidebar.checkbox("Use OpenAI GPT extractor", value=True)
+extractor = st.sidebar.selectbox(
+    "Risk extractor",
+    EXTRACTOR_CHOICES,
+    index=EXTRACTOR_CHOICES.index(DEFAULT_EXTRACTOR) if DEFAULT_EXTRACTOR in EXTRACTOR_CHOICES else 0,
+    format_func=lambda b: {
+        "gpt": "OpenAI GPT-4.1",
+        "local": "Local CPU (embedding match vs TM risk taxonomy)",
+        "keyword": "Keyword heuristics only",
+    }[b],
+)
+use_gpt = extractor == "gpt"
 use_semantic = st.sidebar.checkbox("Use semantic matching (SBERT)", value=True)
 st.sidebar.markdown("---")
 st.sidebar.markdown("Ingested files are saved under `data/ingested/` for reuse.")
+st.sidebar.markdown("Ingestion runs in a background worker pool (`INGEST_WORKERS`); results land in `data/processed/`.")
 
-text = ""
-selected_report = None
+job_id = st.session_state.get("job_id")
 
 if source_type == "Upload local file":
-    uploaded_file = st.sidebar.file_uploader("Upload AML Report (TXT or PDF)", type=["txt", "pdf"])
+    uploaded_file = st.sidebar.file_uploader(
+        "Upload AML Report (TXT, PDF, DOCX, Excel or HTML)", type=UPLOAD_TYPES
+    )
     if uploaded_file is not None:
-        text = read_text_from_file(uploaded_file)
         filename = uploaded_file.name
-        # save raw uploaded file to ingested for traceability
-        save_path = os.path.join("data", "ingested", filename)
-        with open(save_path, "wb") as f:
-            try:
-                uploaded_file.seek(0)
-                f.write(uploaded_file.read())
-            except Exception:
-                # uploaded_file may be a file-like with .getvalue()
-                f.write(uploaded_file.getvalue())
+        # The script reruns on every poll tick and widget change; hash and save an
+        # upload once, keyed by the uploader's id for this file
+        upload_key = (getattr(uploaded_file, "file_id", None) or filename, uploaded_file.size)
+        if st.session_state.get("upload_key") != upload_key:
+            content = uploaded_file.getvalue()
+            # save raw uploaded file to ingested for traceability; the content-addressed
+            # name means same-named uploads never overwrite a file a worker reads
+            digest = hashlib.sha256(content).hexdigest()
+            save_path = os.path.join("data", "ingested", f"{digest}_{os.path.basename(filename)}")
+            if not os.path.exists(save_path):
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(save_path), suffix=".part")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, save_path)
+            st.session_state["upload_key"] = upload_key
+            st.session_state["upload"] = {"digest": digest, "path": save_path}
+        upload = st.session_state["upload"]
+        # Submit only for a new file or new options, so a failed job is not silently
+        # requeued and a job picked under "Recent ingestion jobs" stays selected
+        submission = (upload["digest"], extractor, use_semantic)
+        if st.session_state.get("upload_submission") != submission:
+            job_id = submit_ingestion_job(
+                path=upload["path"],
+                source=filename,
+                use_gpt=use_gpt,
+                use_semantic=use_semantic,
+                backend=extractor,
+                digest=upload["digest"],
+            )
+            st.session_state["upload_submission"] = submission
+            st.session_state["job_id"] = job_id
 else:
     st.sidebar.markdown("Fetching latest PDF reports from FATF website (titles & links)")
     try:
-        reports = fetch_fatf_reports(limit=10)
+        reports = cached_fatf_reports(limit=10)
         titles = [r["title"] for r in reports]
         selected = st.sidebar.selectbox("Select FATF report", ["-- pick one --"] + titles)
         if selected and selected != "-- pick one --":
@@ -45,27 +92,36 @@ else:
             selected_report = reports[idx]
             st.sidebar.write(f"Selected: {selected_report['title']}")
             if st.sidebar.button("Load selected report"):
-                st.sidebar.info("Downloading and extracting PDF text...")
-                text = download_and_extract_pdf_text(selected_report["url"])
-                # save to ingested with safe name
-                safe_name = selected_report['title'].replace("/", "_").replace(" ", "_")[:120] + ".txt"
-                with open(os.path.join("data", "ingested", safe_name), "w", encoding="utf-8") as f:
-                    f.write(text or "")
+                job_id = submit_ingestion_job(
+                    url=selected_report["url"],
+                    source=selected_report["title"],
+                    use_gpt=use_gpt,
+                    use_semantic=use_semantic,
+                    backend=extractor,
+                )
+                st.session_state["job_id"] = job_id
     except Exception as e:
         st.sidebar.error(f"Failed to fetch reports: {e}")
 
-if text:
+with st.sidebar.expander("Recent ingestion jobs"):
+    for job in list_jobs(limit=10):
+        if st.button(f"{job['source'][:40]} — {job['stage']}", key=f"job_{job['id']}"):
+            job_id = job["id"]
+            st.session_state["job_id"] = job_id
+
+job = get_job(job_id) if job_id else None
+
+if job and job["stage"] == "done":
+    result = load_job_result(job_id)
+    extraction = result["extraction"]
     st.subheader("📘 Extracted Summary & Risks")
-    with st.spinner("Extracting risks using AI/NLP..."):
-        extraction = extract_red_flags(text, use_gpt=use_gpt)
+    st.caption(f"Source: {result['source']}")
     st.markdown("**Structured Output (JSON)**:")
     st.json(extraction.get("structured", {}))
     st.markdown("**Fallback/Heuristic Phrases:**")
     st.write(extraction.get("extracted_phrases", []))
     st.subheader("📊 Coverage Assessment")
-    with st.spinner("Assessing coverage against TM models..."):
-        coverage_results = assess_coverage(extraction.get("extracted_phrases", []), semantic=use_semantic)
-    df = pd.DataFrame(coverage_results)
+    df = pd.DataFrame(result["coverage"])
     st.dataframe(df)
     st.subheader("📈 Coverage Status Distribution")
     dist = df['coverage_status'].value_counts().reset_index()
@@ -73,5 +129,13 @@ if text:
     st.bar_chart(dist.set_index('coverage_status'))
     csv = df.to_csv(index=False).encode('utf-8')
     st.download_button("Download coverage report (CSV)", csv, "coverage_report.csv", "text/csv")
+elif job and job["stage"] == "failed":
+    st.error(f"Ingestion of {job['source']} failed: {job['error']}")
+elif job:
+    st.subheader(f"⏳ Ingesting {job['source']}")
+    st.progress(job["progress"], text=f"Stage: {job['stage']}")
+    # Poll the job table; the work itself runs in the background worker pool
+    time.sleep(POLL_INTERVAL_SECONDS)
+    st.rerun()
 else:
-    st.info("Upload a TXT/PDF file or fetch a FATF report from the sidebar to begin.")
+    st.info("Upload a report (TXT, PDF, DOCX, Excel or HTML) or fetch a FATF report from the sidebar to begin.")
@@ -0,0 +1,45 @@
+# Lets pytest import the `utils` package from the repo root.
+import copy
+import hashlib
+
+import numpy as np
+import pytest
+
+TM_MODELS = [
+    {
+        "model_id": "TM001",
+        "model_name": "Retail",
+        "covered_risks": ["structuring", "cash deposits"],
+        "partially_covered_risks": ["third-party transactions"],
+        "not_covered_risks": ["crypto laundering"],
+    },
+    {
+        "model_id": "TM002",
+        "model_name": "Trade",
+        "covered_risks": ["over-invoicing", "structuring"],
+    },
+]
+
+
+def _fake_encode(texts, normalize=False):
+    """Deterministic pseudo-embeddings: one seeded random vector per text, so only identical texts are similar."""
+    single = isinstance(texts, str)
+    vecs = []
+    for t in [texts] if single else texts:
+        seed = int(hashlib.sha256(t.encode("utf-8")).hexdigest()[:8], 16)
+        vecs.append(np.random.default_rng(seed).normal(size=32))
+    vecs = np.array(vecs, dtype=np.float32)
+    if normalize:
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs[0] if single else vecs
+
+
+@pytest.fixture
+def fake_encode():
+    return _fake_encode
+
+
+@pytest.fixture
+def tm_models():
+    """Two small TM models; a fresh copy per test, since tests edit them."""
+    return copy.deepcopy(TM_MODELS)
@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import os
+from utils.coverage_matrix import read_long, refresh as refresh_coverage_matrix
+from utils.corpus_store import get_articles, list_sources, search
+from utils.ai_extractor import EXTRACTORS, extract_red_flags_batch
+from utils.coverage_mapper import assess_coverage, load_tm_models, model_key, models_for_risk
 
 st.set_page_config(page_title="Analytics Dashboard", layout="wide")
 
@@ -9,6 +13,17 @@ st.title("📊 FCRM Analytics & Coverage Insights")
 
 # Load processed data
 DATA_PATH = os.path.join("data", "processed", "coverage_report.csv")
+LONG_PATH = os.path.join("data", "processed", "coverage_long.csv")
+# Extractors fast enough to run on a corpus selection without blocking the session for minutes
+INLINE_BACKENDS = [b for b in ("keyword", "local") if b in EXTRACTORS]
+
+# Re-score only TM models edited since the last run; rewrites DATA_PATH once the matrix holds documents
+try:
+    rescored = refresh_coverage_matrix()
+    if rescored:
+        st.info(f"TM models changed — re-scored coverage for: {', '.join(rescored)}")
+except Exception as e:
+    st.warning(f"Could not refresh coverage matrix: {e}")
 
 if os.path.exists(DATA_PATH):
     df = pd.read_csv(DATA_PATH)
@@ -33,14 +48,77 @@ if os.path.exists(DATA_PATH):
             st.info("No risk_category column found in data.")
 
     st.subheader("🧩 Heatmap - TM Model Coverage vs Risks")
-    if "risk" in df.columns and "tm_model" in df.columns:
-        pivot = df.pivot_table(index="tm_model", columns="risk", values="coverage_status", aggfunc="count", fill_value=0)
-        fig3 = px.imshow(pivot, text_auto=True, aspect="auto", color_continuous_scale="Blues")
-        st.plotly_chart(fig3, use_container_width=True)
+    if os.path.exists(LONG_PATH):
+        long_df = read_long(LONG_PATH)
+        # Semantic matches are against covered/partially covered risks only, never not_covered_risks
+        covered = long_df[long_df["match_type"].isin(["exact", "semantic"])]
+        # Group-by over the categorical codes; cells count documents per (model, risk)
+        pivot = covered.groupby(["model_id", "risk_id"], observed=True).size().unstack(fill_value=0)
+        if pivot.empty:
+            st.info("No extracted risk is covered by any TM model yet.")
+        else:
+            model_names = {model_key(m): m.get("model_name") for m in load_tm_models()}
+            pivot.index = [model_names.get(mid, mid) for mid in pivot.index]
+            fig3 = px.imshow(pivot, text_auto=True, aspect="auto", color_continuous_scale="Blues",
+                             labels={"x": "Risk", "y": "TM Model", "color": "Documents"})
+            st.plotly_chart(fig3, use_container_width=True)
     else:
-        st.warning("Heatmap cannot be generated — missing risk or tm_model columns.")
+        st.warning("Heatmap cannot be generated — no long-format coverage data yet. Run ingestion first.")
+
+    st.subheader("🔁 Which TM models list a risk?")
+    risk_query = st.text_input("Risk", placeholder="e.g. trade-based money laundering")
+    if risk_query:
+        owners = models_for_risk(risk_query)
+        if owners:
+            st.dataframe(pd.DataFrame(owners), use_container_width=True)
+        else:
+            st.info("No TM model lists this risk in any bucket.")
     
     st.subheader("📥 Download Processed Data")
     st.download_button("Download Processed CSV", df.to_csv(index=False), "coverage_report.csv", "text/csv")
 else:
     st.warning("No processed coverage report found. Please run ingestion first.")
+
+st.markdown("---")
+st.subheader("🔎 Regulatory Corpus Search")
+sources = list_sources()
+if not sources:
+    st.info("Corpus store is empty. Run a scraper or `python -m utils.corpus_store` to index the text dumps in `data/`.")
+else:
+    st.caption(" · ".join(f"{s['source']}: {s['articles']} articles ({s['first_date']} → {s['last_date']})" for s in sources))
+    q_col, src_col, date_col = st.columns([2, 1, 1])
+    with q_col:
+        corpus_query = st.text_input("Keywords", placeholder="e.g. hawala, sanctions evasion")
+    with src_col:
+        corpus_sources = st.multiselect("Sources", [s["source"] for s in sources])
+    with date_col:
+        firsts = [s["first_date"] for s in sources if s["first_date"]]
+        lasts = [s["last_date"] for s in sources if s["last_date"]]
+        date_range = st.date_input(
+            "Date range",
+            value=(
+                pd.to_datetime(min(firsts) if firsts else "2000-01-01").date(),
+                pd.to_datetime(max(lasts) if lasts else "2100-01-01").date(),
+            ),
+        )
+    # While picking, the widget briefly holds only the start date
+    start_date = date_range[0] if date_range else None
+    end_date = date_range[1] if len(date_range) > 1 else None
+
+    hits = search(corpus_query, sources=corpus_sources or None, start_date=start_date, end_date=end_date, limit=100)
+    st.write(f"{len(hits)} matching articles")
+    if hits:
+        st.dataframe(pd.DataFrame(hits)[["date", "source", "title", "snippet", "url"]], use_container_width=True)
+
+        # Runs inline in this session, so only the CPU backends; GPT runs go through the ingestion job queue
+        subset_backend = st.selectbox("Extractor for the selection", INLINE_BACKENDS)
+        st.caption("GPT extraction runs in the background: ingest documents from the main page.")
+        if st.button(f"Run extraction & coverage on these {len(hits)} articles"):
+            with st.spinner("Extracting risks and assessing coverage on the selection..."):
+                articles = get_articles([h["id"] for h in hits])
+                extractions = extract_red_flags_batch([a["body"] or "" for a in articles], backend=subset_backend)
+                phrases = sorted({p for e in extractions for p in e["extracted_phrases"]})
+                # Exploratory run: don't append to tm_models.json from the dashboard
+                subset_cov = pd.DataFrame(assess_coverage(phrases, auto_update=False))
+            st.write("**Extracted phrases:**", phrases)
+            st.dataframe(subset_cov, use_container_width=True)
@@ -0,0 +1,150 @@
+import codecs
+import random
+
+import pytest
+
+from utils import ai_extractor, coverage_mapper, embedding_service
+from utils.ai_extractor import (
+    CHARS_PER_TOKEN,
+    iter_text_auto,
+    iter_text_chunks,
+    read_text_auto,
+    select_relevant_passages,
+)
+
+PAGE = "<html><head>{meta}<title>Notice</title></head><body><p>café naïve</p><p>{filler}</p></body></html>"
+
+
+@pytest.mark.parametrize(
+    "encoding, meta, bom",
+    [
+        ("windows-1252", '<meta charset="windows-1252">', b""),
+        ("windows-1252", '<meta http-equiv="Content-Type" content="text/html; charset=windows-1252">', b""),
+        ("utf-8", "", b""),
+        ("utf-8", "", codecs.BOM_UTF8),
+        ("utf-16-le", "", codecs.BOM_UTF16_LE),
+    ],
+)
+@pytest.mark.parametrize("filler", [1, 100_000])
+def test_html_reader_honours_declared_charset(tmp_path, encoding, meta, bom, filler):
+    path = tmp_path / "page.html"
+    path.write_bytes(bom + PAGE.format(meta=meta, filler="x" * filler).encode(encoding))
+    assert list(iter_text_auto(str(path)))[:2] == ["Notice", "café naïve"]
+
+
+WORDS = ["the", "bank", "reported", "funds", "money laundering", "shell company", "wire transfer", "customer"]
+
+
+def random_document(rng):
+    """Lines of random length: blank lines, short sentences and oversized runs."""
+    lines = []
+    for _ in range(rng.randrange(1, 60)):
+        kind = rng.random()
+        if kind < 0.2:
+            lines.append("")
+        elif kind < 0.9:
+            words = rng.choices(WORDS, k=rng.randrange(1, 40))
+            lines.append(" ".join(words).capitalize() + rng.choice([".", "!", "", ". "]))
+        else:
+            lines.append("x" * rng.randrange(500, 5000))
+    return lines
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_chunks_rebuild_extracted_text_and_passages_point_into_it(tmp_path, seed):
+    rng = random.Random(seed)
+    path = tmp_path / "doc.txt"
+    path.write_text("\n".join(random_document(rng)), encoding="utf-8")
+    text = read_text_auto(str(path))
+    chunk_chars = rng.choice([50, 333, 1000, 8000])
+
+    chunks = list(iter_text_chunks(iter_text_auto(str(path)), chunk_chars))
+    assert "".join(chunks) == text
+    assert all(len(c) <= chunk_chars for c in chunks)
+
+    passages = select_relevant_passages(iter_text_chunks(iter_text_auto(str(path)), chunk_chars), 100_000)
+    assert passages or not text.strip()
+    for p in passages:
+        assert text[p["start"]:p["end"]] == p["text"]
+
+
+def test_budget_keeps_the_most_relevant_passages():
+    filler = "\n\n".join(f"Paragraph {i} about quarterly staffing and office moves." for i in range(50))
+    risky = "Investigators traced money laundering through a shell company and hawala wire transfer."
+    text = filler + "\n\n" + risky + "\n\n" + filler
+
+    passages = select_relevant_passages([text], token_budget=40, semantic=False)
+    assert [p["text"] for p in passages] == [risky]
+    assert text[passages[0]["start"]:passages[0]["end"]] == risky
+
+    roomy = select_relevant_passages([text], token_budget=400, semantic=False)
+    assert sum(len(p["text"]) + 32 for p in roomy) <= 400 * CHARS_PER_TOKEN
+    assert [p["start"] for p in roomy] == sorted(p["start"] for p in roomy)
+
+
+def test_keyword_free_text_falls_back_to_document_head():
+    paragraphs = [f"Paragraph {i} about quarterly staffing and office moves." for i in range(50)]
+    text = "\n\n".join(paragraphs)
+
+    passages = select_relevant_passages([text], token_budget=100, semantic=False)
+    assert passages
+    assert [p["text"] for p in passages] == paragraphs[:len(passages)]
+    assert sum(len(p["text"]) + 32 for p in passages) <= 100 * CHARS_PER_TOKEN
+
+
+@pytest.mark.parametrize(
+    "backend, use_gpt, env, expected",
+    [
+        ("local", False, "keyword", "local"),
+        (None, False, "local", "keyword"),
+        (None, True, "local", "gpt"),
+        (None, None, "local", "local"),
+        (None, None, "", "gpt"),
+    ],
+)
+def test_backend_precedence(monkeypatch, backend, use_gpt, env, expected):
+    monkeypatch.setattr(ai_extractor, "EXTRACTOR_BACKEND", env)
+    assert ai_extractor._resolve_backend(backend, use_gpt) is ai_extractor.EXTRACTORS[expected]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        ai_extractor._resolve_backend("nope", None)
+
+
+@pytest.fixture
+def local_taxonomy(monkeypatch, tm_models, fake_encode):
+    tm_models[0]["covered_risks"].append("Funds were layered through nominee accounts.")
+    monkeypatch.setattr(coverage_mapper, "load_tm_models", lambda path=None: tm_models)
+    monkeypatch.setattr(coverage_mapper, "_risk_index", None)
+    monkeypatch.setattr(embedding_service, "encode", fake_encode)
+    return tm_models
+
+
+def test_local_backend_result_shape_and_evidence_offsets(local_taxonomy):
+    text = (
+        "The annual report was filed on time by the bank.\n\n"
+        "Later that year an audit began. Funds were layered through nominee accounts. "
+        "The audit also flagged structuring of cash deposits."
+    )
+    result = ai_extractor.extract_red_flags(text, backend="local")
+
+    assert set(result) == {"structured", "extracted_phrases", "passages"}
+    assert set(result["structured"]) == {"risks", "summary", "evidence"}
+    evidence = result["structured"]["evidence"]
+    assert evidence[0]["risk"] == "Funds were layered through nominee accounts."
+    assert evidence[0]["model_id"] == "TM001"
+    assert text[evidence[0]["start"]:evidence[0]["end"]] == evidence[0]["risk"]
+    # Keyword hits are kept after the embedding matches
+    assert result["extracted_phrases"][0] == evidence[0]["risk"]
+    assert "structuring" in result["extracted_phrases"]
+    assert evidence[0]["risk"] in result["structured"]["summary"]
+    for p in result["passages"]:
+        assert set(p) == {"start", "end", "score"}
+
+
+def test_batch_matches_single_calls(local_taxonomy):
+    texts = ["Funds were layered through nominee accounts.", "Nothing to report this quarter at all."]
+    batch = ai_extractor.extract_red_flags_batch(texts, backend="local", batch_size=1)
+    assert batch == [ai_extractor.extract_red_flags(t, backend="local") for t in texts]
+    assert batch[1]["extracted_phrases"] == []
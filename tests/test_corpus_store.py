@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from utils import corpus_store
+from utils.corpus_store import import_dump, iter_dump_articles, search
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+FED_DUMP = os.path.join(DATA_DIR, "federal_reserve_press_releases.txt")
+DFS_DUMP = os.path.join(DATA_DIR, "dfs_press_releases_content.txt")
+
+
+@pytest.fixture(autouse=True)
+def corpus_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_store, "CORPUS_DB", str(tmp_path / "corpus.db"))
+
+
+def test_fed_dump_headers_stay_out_of_bodies():
+    articles = list(iter_dump_articles(FED_DUMP, "fed"))
+    assert len(articles) == 24
+
+    first = articles[0]
+    assert first["title"] == "Agencies announce third public outreach meeting as part of their review of regulations"
+    assert first["date"] == "2025-09-09"
+    assert first["url"] == "https://www.federalreserve.gov/newsevents/pressreleases/bcreg20250909a.htm"
+    assert first["body"].startswith("September 09, 2025")
+
+    # The second record lists PDF attachments before its content
+    assert articles[1]["body"].startswith("September 30, 2025")
+    for a in articles:
+        assert a["url"].startswith("https://www.federalreserve.gov/")
+        assert a["date"] and a["body"]
+        assert "PDF Links:" not in a["body"]
+        assert "Content:" not in a["body"].splitlines()
+
+
+def test_dfs_dump_numbered_records():
+    articles = list(iter_dump_articles(DFS_DUMP, "dfs"))
+    assert len(articles) == 8
+
+    first = articles[0]
+    assert first["title"] == "Governor Hochul Calls on Insurers to Cover Life-Saving Vaccines in New York State"
+    assert first["date"] == "2025-09-10"
+    assert first["url"] == "https://www.dfs.ny.gov/reports_and_publications/press_releases/pr20250910"
+    assert first["subtitle"].startswith("Amidst Uncertainty at the CDC")
+    assert first["body"].startswith("In light of continued attacks on science")
+    for a in articles:
+        assert a["url"].startswith("https://www.dfs.ny.gov/")
+        assert "URL:" not in a["body"] and "Date:" not in a["body"]
+        assert not a["body"].endswith("=")
+
+
+def test_imported_dump_is_searchable():
+    assert import_dump(DFS_DUMP) == 8
+    # Re-importing upserts by URL instead of duplicating
+    assert import_dump(DFS_DUMP) == 8
+
+    hits = search("blockchain analytics", sources=["dfs"])
+    assert hits[0]["title"].startswith("DFS Superintendent Adrienne A. Harris Extends Blockchain Analytics")
+    assert all(h["source"] == "dfs" for h in hits)
+    assert search("blockchain analytics", sources=["fed"]) == []
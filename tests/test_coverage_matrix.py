@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from utils import coverage_matrix, embedding_service
+from utils.coverage_mapper import match_phrase
+
+
+@pytest.fixture(autouse=True)
+def matrix_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(coverage_matrix, "MATRIX_DB", str(tmp_path / "coverage_matrix.db"))
+    monkeypatch.setattr(coverage_matrix, "REPORT_PATH", str(tmp_path / "coverage_report.csv"))
+    monkeypatch.setattr(coverage_matrix, "LONG_REPORT_PATH", str(tmp_path / "coverage_long.csv"))
+    # Exact-only scoring unless a test opts into fake_embeddings
+    monkeypatch.setattr(embedding_service, "available", lambda: False)
+    return tmp_path
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch, fake_encode):
+    monkeypatch.setattr(embedding_service, "available", lambda: True)
+    monkeypatch.setattr(embedding_service, "encode", fake_encode)
+
+
+def cell(phrase, model_id):
+    cells = coverage_matrix.load_cells()
+    row = cells[(cells["phrase"] == phrase) & (cells["model_id"] == model_id)]
+    return row["match_type"].iloc[0]
+
+
+def test_refresh_rescores_only_edited_model(tm_models):
+    coverage_matrix.record_document("doc1", ["structuring", "trade finance"], tm_models=tm_models)
+    assert cell("trade finance", "TM002") == "none"
+
+    tm_models[1]["covered_risks"].append("trade finance")
+    assert coverage_matrix.refresh(tm_models) == ["TM002"]
+    assert cell("trade finance", "TM002") == "exact"
+    assert coverage_matrix.refresh(tm_models) == []
+
+
+def test_not_covered_append_keeps_version_and_never_matches(fake_embeddings, tm_models):
+    coverage_matrix.record_document("doc1", ["crypto laundering", "cash deposits"], tm_models=tm_models)
+    assert cell("crypto laundering", "TM001") == "none"
+    assert cell("cash deposits", "TM001") == "exact"
+
+    # What assess_coverage(auto_update=True) does for an uncovered phrase
+    tm_models[1].setdefault("not_covered_risks", []).append("crypto laundering")
+    assert coverage_matrix.refresh(tm_models) == []
+    assert match_phrase(tm_models[1], "crypto laundering") == ("none", 0.0)
+
+
+def test_scoring_mode_is_per_matrix_not_per_caller(monkeypatch, tm_models, fake_encode):
+    coverage_matrix.record_document("doc1", ["over invoicing"], tm_models=tm_models)
+    assert cell("over invoicing", "TM002") == "none"
+
+    # Embeddings become available: every column is re-scored semantically
+    monkeypatch.setattr(embedding_service, "available", lambda: True)
+    monkeypatch.setattr(
+        embedding_service, "encode", lambda texts, normalize=False: fake_encode(
+            [t.replace("-", " ") for t in texts], normalize
+        )
+    )
+    assert sorted(coverage_matrix.refresh(tm_models)) == ["TM001", "TM002"]
+    assert cell("over invoicing", "TM002") == "semantic"
+    assert coverage_matrix.refresh(tm_models) == []
+
+
+def test_refresh_on_empty_matrix_keeps_existing_report(matrix_paths, tm_models):
+    report = matrix_paths / "coverage_report.csv"
+    report.write_text("document,model_name\nold.pdf,Retail\n", encoding="utf-8")
+
+    coverage_matrix.refresh(tm_models)
+    assert report.read_text(encoding="utf-8") == "document,model_name\nold.pdf,Retail\n"
+
+
+def test_document_without_phrases_is_reported(tm_models):
+    coverage_matrix.record_document("doc1", ["cash deposits"], tm_models=tm_models)
+    coverage_matrix.record_document("empty", [], source="empty.pdf", tm_models=tm_models)
+
+    report = pd.read_csv(coverage_matrix.REPORT_PATH)
+    assert len(report) == 4
+    empty = report[report["document"] == "empty.pdf"]
+    assert list(empty["model_name"]) == ["Retail", "Trade"]
+    assert set(empty["coverage_status"]) == {"No Risks Found"}
+    doc1 = report[report["document"] == "doc1"].set_index("model_name")["coverage_status"]
+    assert doc1["Retail"] == "Completely Covered"
+    assert doc1["Trade"] == "Not Covered"
+
+
+def test_concurrent_report_writes(matrix_paths, tm_models):
+    coverage_matrix.record_document("doc1", ["structuring"], tm_models=tm_models, write=False)
+    assert not (matrix_paths / "coverage_report.csv").exists()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: coverage_matrix.write_report(), range(16)))
+
+    assert len(pd.read_csv(coverage_matrix.REPORT_PATH)) == 2
+    assert not list(matrix_paths.glob("*.part"))
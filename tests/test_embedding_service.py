@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+import pytest
+
+from utils import embedding_service
+from utils.coverage_mapper import assess_coverage
+from utils.embedding_service import EmbeddingCache
+
+
+@pytest.fixture
+def shared_service(monkeypatch):
+    monkeypatch.setattr(embedding_service, "SERVICE_ADDR", "127.0.0.1:1")
+    monkeypatch.setattr(embedding_service, "_client", None)
+    monkeypatch.setattr(embedding_service, "_client_retry_at", 0.0)
+    connects = []
+
+    def refuse(self):
+        connects.append(self)
+        raise ConnectionRefusedError("refused")
+
+    monkeypatch.setattr(embedding_service._ServiceManager, "connect", refuse)
+    return connects
+
+
+def test_missing_authkey_disables_embeddings(shared_service, monkeypatch):
+    monkeypatch.setattr(embedding_service, "SERVICE_AUTHKEY", "")
+    assert embedding_service.available() is False
+    assert embedding_service.available() is False
+    assert shared_service == []
+    # Coverage falls back to exact matching instead of raising
+    results = assess_coverage(["hawala"], auto_update=False)
+    assert results and all(r["coverage_status"] for r in results)
+
+
+def test_unreachable_server_is_not_redialled(shared_service, monkeypatch):
+    monkeypatch.setattr(embedding_service, "SERVICE_AUTHKEY", "secret")
+    assert embedding_service._get_client() is None
+    assert embedding_service._get_client() is None
+    assert len(shared_service) == 1
+
+    monkeypatch.setattr(embedding_service, "_client_retry_at", time.monotonic() - 1)
+    assert embedding_service._get_client() is None
+    assert len(shared_service) == 2
+
+
+def test_cache_hits_touch_last_used_lazily(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+    cache.put_many("m", {"a": np.ones(4), "b": np.zeros(4)})
+    cache._conn.execute("UPDATE embeddings SET last_used = 0 WHERE text = 'a'")
+    cache._conn.commit()
+    before = dict(cache._conn.execute("SELECT text, last_used FROM embeddings"))
+
+    found = cache.get_many("m", ["a", "b", "c"])
+    assert sorted(found) == ["a", "b"]
+    after = dict(cache._conn.execute("SELECT text, last_used FROM embeddings"))
+    assert after["a"] > 0
+    assert after["b"] == before["b"]
+    assert cache._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
@@ -0,0 +1,79 @@
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from utils import job_queue
+
+
+@pytest.fixture(autouse=True)
+def jobs_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOBS_DB", str(tmp_path / "jobs.db"))
+    submitted = []
+    monkeypatch.setattr(job_queue, "_get_executor", lambda: None)
+    monkeypatch.setattr(job_queue, "_submit", lambda job_id, payload: submitted.append(job_id))
+    return submitted
+
+
+def test_concurrent_submits_coalesce(tmp_path, jobs_db, monkeypatch):
+    path = tmp_path / "report.txt"
+    path.write_text("structuring via shell companies", encoding="utf-8")
+
+    # Widen the window between the dedup check and the insert
+    real_uuid4 = job_queue.uuid.uuid4
+    monkeypatch.setattr(job_queue.uuid, "uuid4", lambda: time.sleep(0.02) or real_uuid4())
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda _: job_queue.submit_ingestion_job(path=str(path), backend="keyword"), range(8)))
+
+    assert len(set(ids)) == 1
+    assert jobs_db == ids[:1]
+    # Other options, or a failed job, get a fresh one
+    assert job_queue.submit_ingestion_job(path=str(path), backend="local") != ids[0]
+    job_queue._update_job(ids[0], "failed", error="boom")
+    assert job_queue.submit_ingestion_job(path=str(path), backend="keyword") not in ids
+
+
+def test_digest_skips_rereading_the_file(tmp_path):
+    path = tmp_path / "report.txt"
+    path.write_text("hawala", encoding="utf-8")
+    job_id = job_queue.submit_ingestion_job(path=str(path), backend="keyword")
+    digest = job_queue._file_digest(str(path))
+    path.unlink()
+    assert job_queue.submit_ingestion_job(path=str(path), backend="keyword", digest=digest) == job_id
+
+
+def test_dead_worker_fails_job_and_drops_pool(tmp_path, monkeypatch):
+    path = tmp_path / "report.txt"
+    path.write_text("hawala", encoding="utf-8")
+    job_id = job_queue.submit_ingestion_job(path=str(path), backend="keyword")
+
+    class Pool:
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut = True
+
+    pool = Pool()
+    monkeypatch.setattr(job_queue, "_executor", pool)
+    future = Future()
+    future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+    job_queue._on_job_finished(job_id, pool, future)
+
+    job = job_queue.get_job(job_id)
+    assert job["stage"] == "failed" and "BrokenProcessPool" in job["error"]
+    assert job_queue._executor is None and pool.shut
+
+
+def test_legacy_duplicate_jobs_are_superseded():
+    with sqlite3.connect(job_queue.JOBS_DB) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, dedup_key TEXT NOT NULL, source TEXT, payload TEXT, "
+            "stage TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, result_path TEXT, error TEXT, "
+            "created_at TEXT, updated_at TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO jobs (id, dedup_key, stage, created_at) VALUES (?, 'k', 'done', ?)",
+            [("old", "2025-01-01"), ("new", "2025-02-01")],
+        )
+    assert job_queue.get_job("old")["stage"] == "failed"
+    assert job_queue.get_job("new")["stage"] == "done"
@@ -0,0 +1,54 @@
+import pytest
+
+from utils import risk_index
+from utils.risk_index import RiskIndex, build_risk_index
+
+
+@pytest.fixture(autouse=True)
+def numpy_backend(monkeypatch):
+    # Exercise the NumPy code paths whether or not hnswlib is installed
+    monkeypatch.setattr(risk_index, "hnswlib", None)
+
+
+def test_exact_search_returns_entry_with_metadata(tm_models, fake_encode):
+    index = build_risk_index(tm_models, fake_encode)
+    assert len(index) == 6
+
+    hits = index.query(["cash deposits"], k=2)[0]
+    assert hits[0]["risk"] == "cash deposits"
+    assert hits[0]["model_id"] == "TM001"
+    assert hits[0]["bucket"] == "covered_risks"
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert hits[0]["score"] >= hits[1]["score"]
+
+
+def test_min_score_widens_k_to_every_hit_above_threshold(tm_models, fake_encode):
+    index = build_risk_index(tm_models, fake_encode)
+    # "structuring" is listed by both models; both must come back even with k=1
+    hits = index.query(["structuring"], k=1, min_score=0.99)[0]
+    assert sorted(h["model_id"] for h in hits) == ["TM001", "TM002"]
+
+
+def test_duplicates_are_skipped_and_incremental_add_is_searchable(tm_models, fake_encode):
+    index = build_risk_index(tm_models, fake_encode)
+    assert index.add([{"model_id": "TM001", "bucket": "covered_risks", "risk": "Structuring"}]) == 0
+
+    index.add([{"model_id": "TM002", "bucket": "not_covered_risks", "risk": "hawala"}])
+    hit = index.query(["hawala"], k=1)[0][0]
+    assert (hit["model_id"], hit["risk"]) == ("TM002", "hawala")
+
+
+def test_ivf_search_finds_stored_vectors(monkeypatch, fake_encode):
+    monkeypatch.setattr(risk_index, "IVF_MIN_SIZE", 100)
+    index = RiskIndex(fake_encode)
+    index.add({"model_id": f"M{i % 7}", "bucket": "covered_risks", "risk": f"risk {i}"} for i in range(300))
+    assert index._centroids is not None
+
+    # Entries added after training are assigned to a list and still found
+    index.add([{"model_id": "M9", "bucket": "covered_risks", "risk": "late risk"}])
+    assert len(index._assign) == len(index) == 301
+
+    queries = ["risk 5", "risk 123", "risk 299", "late risk"]
+    for phrase, hits in zip(queries, index.query(queries, k=3)):
+        assert hits[0]["risk"] == phrase
+        assert hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
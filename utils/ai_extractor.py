@@ -1,66 +1,222 @@
 import os
+import codecs
 import json
 import re
+import heapq
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import docx
 import fitz  # PyMuPDF
-from bs4 import BeautifulSoup
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from lxml import etree
+from openpyxl import load_workbook
 from deep_translator import GoogleTranslator
 from openai import OpenAI
 
-# --- Initialize OpenAI client (uses OPENAI_API_KEY from env) ---
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+# --- OpenAI client (uses OPENAI_API_KEY from env), created on the first GPT call ---
+# Recent SDKs reject a missing key at construction, which would break importing
+# this module for the keyword/local backends and the file readers.
+_client = None
+
+
+def _openai_client():
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 
 # ============================================================
 # 📂 FILE READERS
 # ============================================================
-def _read_text_from_docx(file_path):
-    """Extract text from a Word document."""
+# Readers are generators yielding text blocks (paragraphs, table rows, sheet
+# rows, pages) so large inputs never have to be held in memory as one string.
+_HTML_READ_SIZE = 64 * 1024
+_HTML_SKIP_TAGS = {"script", "style", "noscript"}
+_HTML_BLOCK_TAGS = {
+    "p", "div", "br", "li", "tr", "td", "th", "table", "section", "article",
+    "header", "footer", "blockquote", "pre", "title",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+}
+
+
+def _iter_text_from_docx(file_path):
+    """Yield paragraph and table-row text from a Word document in body order."""
     doc = docx.Document(file_path)
-    return "\n".join([p.text for p in doc.paragraphs])
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn("w:p"):
+            text = Paragraph(child, doc).text
+            if text.strip():
+                yield text
+        elif child.tag == qn("w:tbl"):
+            for row in Table(child, doc).rows:
+                text = " ".join(cell.text for cell in row.cells if cell.text)
+                if text.strip():
+                    yield text
+
+
+def _iter_text_from_excel(file_path):
+    """Yield one line of text per non-empty row across all sheets of a workbook."""
+    if file_path.lower().endswith(".xls"):
+        # openpyxl cannot read legacy .xls; fall back to pandas per sheet
+        for df in pd.read_excel(file_path, sheet_name=None, header=None).values():
+            for row in df.itertuples(index=False):
+                cells = [str(v) for v in row if not pd.isna(v)]
+                if cells:
+                    yield " ".join(cells)
+        return
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            for row in ws.iter_rows(values_only=True):
+                cells = [str(v) for v in row if v is not None]
+                if cells:
+                    yield " ".join(cells)
+    finally:
+        wb.close()
+
+
+class _HTMLTextTarget:
+    """lxml parser target collecting visible text, split on block-level tags."""
+
+    def __init__(self):
+        self.blocks = []
+        self._buf = []
+        self._skip_depth = 0
+
+    def _flush(self):
+        text = " ".join("".join(self._buf).split())
+        if text:
+            self.blocks.append(text)
+        self._buf = []
+
+    def start(self, tag, attrib):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag in _HTML_SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _HTML_BLOCK_TAGS:
+            self._flush()
+
+    def end(self, tag):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag in _HTML_SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _HTML_BLOCK_TAGS:
+            self._flush()
 
+    def data(self, data):
+        if not self._skip_depth:
+            self._buf.append(data)
 
-def _read_text_from_excel(file_path):
-    """Extract text from all cells in an Excel file."""
-    df = pd.read_excel(file_path)
-    return "\n".join(df.astype(str).apply(lambda x: " ".join(x), axis=1))
+    def comment(self, text):
+        pass
 
+    def close(self):
+        self._flush()
 
-def _read_text_from_html(file_path):
-    """Extract visible text from an HTML file."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f.read(), "html.parser")
-    return soup.get_text(separator="\n")
+    def drain(self):
+        blocks, self.blocks = self.blocks, []
+        return blocks
 
 
-def _read_text_from_pdf(file_path):
-    """Extract text from all pages of a PDF."""
-    text = ""
+_HTML_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+_BOMS = (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+
+def _sniff_html_encoding(head):
+    """
+    Encoding to force on the parser for a page starting with `head`: the
+    <meta> charset, None if a BOM lets lxml detect it, else UTF-8.
+    """
+    if head.startswith(_BOMS):
+        return None
+    m = _HTML_CHARSET.search(head)
+    if m:
+        try:
+            return codecs.lookup(m.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def _iter_text_from_html(file_path):
+    """Yield visible text blocks from an HTML file using lxml's incremental parser."""
+    target = _HTMLTextTarget()
+    with open(file_path, "rb") as f:
+        head = f.read(_HTML_READ_SIZE)
+        parser = etree.HTMLParser(target=target, encoding=_sniff_html_encoding(head))
+        parser.feed(head)
+        yield from target.drain()
+        for data in iter(lambda: f.read(_HTML_READ_SIZE), b""):
+            parser.feed(data)
+            yield from target.drain()
+    parser.close()
+    yield from target.drain()
+
+
+def _iter_text_from_pdf(file_path):
+    """Yield the text of each PDF page."""
     with fitz.open(file_path) as doc:
         for page in doc:
-            text += page.get_text("text") + "\n"
-    return text
+            yield page.get_text("text")
 
 
-def read_text_auto(file_path):
-    """Automatically detect and read supported file types."""
+def _iter_text_from_txt(file_path):
+    """Yield lines from a plain-text file."""
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def iter_text_auto(file_path):
+    """Detect the file type and return a generator of text blocks."""
     ext = os.path.splitext(file_path)[1].lower()
     if ext == ".txt":
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+        return _iter_text_from_txt(file_path)
     elif ext == ".pdf":
-        return _read_text_from_pdf(file_path)
+        return _iter_text_from_pdf(file_path)
     elif ext == ".docx":
-        return _read_text_from_docx(file_path)
+        return _iter_text_from_docx(file_path)
     elif ext in [".xls", ".xlsx"]:
-        return _read_text_from_excel(file_path)
+        return _iter_text_from_excel(file_path)
     elif ext in [".html", ".htm"]:
-        return _read_text_from_html(file_path)
+        return _iter_text_from_html(file_path)
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
 
+def iter_text_chunks(blocks, chunk_chars=8000):
+    """
+    Re-cut text blocks into chunks of at most `chunk_chars`, preferring
+    block boundaries. Each block's joining newline travels with it, so the
+    chunks concatenate to exactly "\n".join(blocks), the text read_text_auto
+    returns, even where an oversized block is split hard.
+    """
+    buf, size = [], 0
+    for i, block in enumerate(blocks):
+        piece = "\n" + block if i else block
+        if size + len(piece) > chunk_chars and buf:
+            yield "".join(buf)
+            buf, size = [], 0
+        # Oversized blocks (e.g. a whole-page PDF string) are split hard
+        while len(piece) > chunk_chars:
+            yield piece[:chunk_chars]
+            piece = piece[chunk_chars:]
+        if piece:
+            buf.append(piece)
+            size += len(piece)
+    if buf:
+        yield "".join(buf)
+
+
+def read_text_auto(file_path):
+    """Automatically detect and read supported file types."""
+    return "\n".join(iter_text_auto(file_path))
+
+
 # ============================================================
 # 🌍 LANGUAGE TRANSLATION
 # ============================================================
@@ -75,27 +231,29 @@ def translate_to_english(text):
 # ============================================================
 # 🤖 RISK EXTRACTION
 # ============================================================
-def extract_red_flags(text, use_gpt=True):
-    """
-    Extract AML/CFT red flags, risk indicators, and summaries
-    using GPT-4.1 if available, else fallback to keyword heuristics.
-    """
-    text = translate_to_english(text[:8000])  # Translate & trim
+RISK_KEYWORDS = [
+    "money laundering", "terrorism financing", "suspicious transaction",
+    "kyc", "aml", "risk assessment", "high-risk", "threshold", "alert",
+    "structuring", "fraud", "sanction", "shell company", "beneficial owner",
+    "wire transfer", "cross-border", "politically exposed", "bribery",
+    "corruption", "tax evasion", "hawala", "unusual transaction",
+    "cash deposit", "front company", "smurfing", "layering", "integration"
+]
+_RISK_PATTERNS = [(kw, re.compile(rf"\b{kw}\b", re.IGNORECASE)) for kw in RISK_KEYWORDS]
 
-    extracted = []
-    risk_keywords = [
-        "money laundering", "terrorism financing", "suspicious transaction",
-        "kyc", "aml", "risk assessment", "high-risk", "threshold", "alert",
-        "structuring", "fraud", "sanction", "shell company", "beneficial owner",
-        "wire transfer", "cross-border", "politically exposed", "bribery",
-        "corruption", "tax evasion", "hawala", "unusual transaction",
-        "cash deposit", "front company", "smurfing", "layering", "integration"
-    ]
+
+def _match_risk_keywords(text):
+    """Return the risk keywords that occur in `text`, in keyword-list order."""
+    return [kw for kw, pattern in _RISK_PATTERNS if pattern.search(text)]
+
+
+def _extract_from_passages(passages, extracted, use_gpt=True):
+    """Run the heuristic + GPT extraction over pre-selected passages."""
+    text = translate_to_english(format_passages(passages))
 
     # --- Heuristic Extraction ---
-    for kw in risk_keywords:
-        if re.search(rf"\b{kw}\b", text, re.IGNORECASE):
-            extracted.append(kw)
+    extracted = list(extracted)
+    extracted.extend(kw for kw in _match_risk_keywords(text) if kw not in extracted)
 
     structured = {"risks": extracted, "summary": ""}
 
@@ -104,14 +262,15 @@ def extract_red_flags(text, use_gpt=True):
         try:
             prompt = f"""
             You are an AML risk analysis assistant.
-            From the text below, extract potential AML/CFT risks and provide a short summary.
+            From the excerpts below, extract potential AML/CFT risks and provide a short summary.
+            Each excerpt is prefixed with its character range in the document's extracted text.
             Respond strictly in JSON with keys: "risks" (list of risk names) and "summary" (paragraph).
             
-            Text:
-            {text[:7000]}
+            Excerpts:
+            {text}
             """
 
-            response = client.chat.completions.create(
+            response = _openai_client().chat.completions.create(
                 model="gpt-4.1",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
@@ -144,18 +303,297 @@ def extract_red_flags(text, use_gpt=True):
 
     return {
         "structured": structured,
-        "extracted_phrases": structured["risks"]
+        "extracted_phrases": structured["risks"],
+        "passages": [{k: p[k] for k in ("start", "end", "score")} for p in passages],
     }
 
 
+# ============================================================
+# 🔌 EXTRACTOR BACKENDS
+# ============================================================
+# A backend takes a list of (passages, keyword_hits) documents and returns one
+# {"structured", "extracted_phrases", "passages"} result per document.
+EXTRACTOR_BACKEND = os.getenv("EXTRACTOR_BACKEND", "")
+GPT_CONCURRENCY = int(os.getenv("GPT_CONCURRENCY", "4"))
+LOCAL_MATCH_THRESHOLD = float(os.getenv("LOCAL_MATCH_THRESHOLD", "0.6"))
+_LOCAL_MIN_WORDS = 3
+
+EXTRACTORS = {}
+
+
+def register_extractor(name, fn):
+    """Register an extraction backend under `name`."""
+    EXTRACTORS[name] = fn
+
+
+def _gpt_backend(docs):
+    # Remote calls are I/O bound; overlap them
+    with ThreadPoolExecutor(max_workers=max(1, GPT_CONCURRENCY)) as pool:
+        return list(pool.map(lambda d: _extract_from_passages(d[0], d[1], use_gpt=True), docs))
+
+
+def _keyword_backend(docs):
+    return [_extract_from_passages(passages, kws, use_gpt=False) for passages, kws in docs]
+
+
+def _local_backend(docs):
+    """
+    Offline extractor: match sentences of the selected passages against the
+    TM risk taxonomy by embedding similarity. All sentences of the batch are
+    embedded in one call, so latency scales with the batch, not with calls.
+    """
+    from utils.coverage_mapper import get_risk_index, load_tm_models
+
+    index = get_risk_index(load_tm_models())
+
+    sentences = []
+    for doc_idx, (passages, _) in enumerate(docs):
+        for p in passages:
+            pos = 0
+            for part in _SENTENCE_BREAK.split(p["text"]):
+                start = p["text"].find(part, pos)
+                pos = start + len(part)
+                if len(part.split()) >= _LOCAL_MIN_WORDS:
+                    sentences.append((doc_idx, p["start"] + start, p["start"] + pos, part))
+
+    hits = index.query([s[3] for s in sentences], k=3, min_score=LOCAL_MATCH_THRESHOLD)
+
+    per_doc = [{"risks": {}, "sentences": []} for _ in docs]
+    for (doc_idx, start, end, text), sent_hits in zip(sentences, hits):
+        if not sent_hits:
+            continue
+        found = per_doc[doc_idx]
+        found["sentences"].append((sent_hits[0]["score"], start, text))
+        for h in sent_hits:
+            key = h["risk"].lower()
+            if key not in found["risks"] or h["score"] > found["risks"][key]["score"]:
+                found["risks"][key] = {
+                    "risk": h["risk"],
+                    "model_id": h["model_id"],
+                    "score": round(h["score"], 3),
+                    "start": start,
+                    "end": end,
+                }
+
+    results = []
+    for (passages, kws), found in zip(docs, per_doc):
+        evidence = sorted(found["risks"].values(), key=lambda e: -e["score"])
+        risks = [e["risk"] for e in evidence]
+        risks.extend(kw for kw in kws if kw.lower() not in found["risks"])
+        # Extractive summary: the three best-matching sentences in document order
+        top = sorted(sorted(found["sentences"], reverse=True)[:3], key=lambda s: s[1])
+        structured = {
+            "risks": risks,
+            "summary": " ".join(s[2] for s in top),
+            "evidence": evidence,
+        }
+        results.append(
+            {
+                "structured": structured,
+                "extracted_phrases": risks,
+                "passages": [{k: p[k] for k in ("start", "end", "score")} for p in passages],
+            }
+        )
+    return results
+
+
+register_extractor("gpt", _gpt_backend)
+register_extractor("keyword", _keyword_backend)
+register_extractor("local", _local_backend)
+
+
+def _resolve_backend(backend, use_gpt):
+    """An explicit backend wins, then use_gpt, then EXTRACTOR_BACKEND, then "gpt"."""
+    if not backend:
+        if use_gpt is not None:
+            backend = "gpt" if use_gpt else "keyword"
+        else:
+            backend = EXTRACTOR_BACKEND or "gpt"
+    if backend not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor backend: {backend}")
+    return EXTRACTORS[backend]
+
+
+def extract_red_flags(text, use_gpt=None, token_budget=None, backend=None):
+    """
+    Extract AML/CFT red flags, risk indicators, and summaries
+    using GPT-4.1 if available, else fallback to keyword heuristics.
+    Only the most risk-relevant passages (within `token_budget`) are used.
+    `backend` picks a registered extractor ("gpt", "keyword", "local");
+    without it use_gpt chooses gpt/keyword, and with neither given the
+    EXTRACTOR_BACKEND env var does.
+    """
+    passages = select_relevant_passages([text], token_budget)
+    return _resolve_backend(backend, use_gpt)([(passages, _match_risk_keywords(text))])[0]
+
+
+def extract_red_flags_batch(texts, backend=None, use_gpt=None, token_budget=None, batch_size=32):
+    """Extract from many texts, handing the backend `batch_size` documents at a time."""
+    fn = _resolve_backend(backend, use_gpt)
+    results = []
+    for i in range(0, len(texts), batch_size):
+        docs = [
+            (select_relevant_passages([t], token_budget), _match_risk_keywords(t))
+            for t in texts[i:i + batch_size]
+        ]
+        results.extend(fn(docs))
+    return results
+
+
+def extract_red_flags_from_file(file_path, use_gpt=None, chunk_chars=8000, token_budget=None, backend=None):
+    """
+    Stream a document through the extractor chunk by chunk.
+
+    Keyword heuristics run over every chunk and passage selection keeps a
+    bounded candidate pool, so memory use is bounded by `chunk_chars` and
+    the token budget rather than by the size of the document.
+    """
+    extracted = []
+
+    def chunks():
+        for chunk in iter_text_chunks(iter_text_auto(file_path), chunk_chars):
+            extracted.extend(kw for kw in _match_risk_keywords(chunk) if kw not in extracted)
+            yield chunk
+
+    passages = select_relevant_passages(chunks(), token_budget)
+    return _resolve_backend(backend, use_gpt)([(passages, extracted)])[0]
+
+
+# ============================================================
+# 🎯 PROMPT COMPRESSION
+# ============================================================
+# The GPT prompt gets the highest-scoring passages of the document packed into
+# a token budget, instead of whatever happens to be in the first 7000 chars.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1750"))
+PROMPT_SELECT_SEMANTIC = os.getenv("PROMPT_SELECT_SEMANTIC", "0") == "1"
+CHARS_PER_TOKEN = 4
+_PASSAGE_MAX_CHARS = 1200
+_MAX_CANDIDATES = 200
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def _trimmed(text, start, end, base):
+    """(start, end, text) of text[start:end] with surrounding whitespace dropped."""
+    piece = text[start:end]
+    stripped = piece.strip()
+    lead = len(piece) - len(piece.lstrip())
+    return base + start + lead, base + start + lead + len(stripped), stripped
+
+
+def _split_passages(text, base=0):
+    """Yield (start, end, text) paragraphs of at most _PASSAGE_MAX_CHARS."""
+    pos = 0
+    for m in list(_PARAGRAPH_BREAK.finditer(text)) + [None]:
+        para_start, para_end = pos, (m.start() if m else len(text))
+        pos = m.end() if m else len(text)
+        if not text[para_start:para_end].strip():
+            continue
+        if para_end - para_start <= _PASSAGE_MAX_CHARS:
+            yield _trimmed(text, para_start, para_end, base)
+            continue
+        # Long paragraph: pack whole sentences, hard-cutting any single giant one
+        seg_start = para_start
+        cut = para_start  # end of the last complete sentence in the current segment
+        para = text[para_start:para_end]
+        for sm in list(_SENTENCE_BREAK.finditer(para)) + [None]:
+            sent_end = para_start + (sm.start() if sm else len(para))
+            if sent_end - seg_start > _PASSAGE_MAX_CHARS and cut > seg_start:
+                yield _trimmed(text, seg_start, cut, base)
+                seg_start = cut
+            while sent_end - seg_start > _PASSAGE_MAX_CHARS:
+                yield _trimmed(text, seg_start, seg_start + _PASSAGE_MAX_CHARS, base)
+                seg_start += _PASSAGE_MAX_CHARS
+            cut = sent_end
+        if text[seg_start:cut].strip():
+            yield _trimmed(text, seg_start, cut, base)
+
+
+def _keyword_score(text):
+    """Risk-keyword density of a passage: hits per sqrt(token)."""
+    distinct = 0
+    occurrences = 0
+    for _, pattern in _RISK_PATTERNS:
+        n = len(pattern.findall(text))
+        if n:
+            distinct += 1
+            occurrences += n
+    tokens = max(len(text) / CHARS_PER_TOKEN, 20)
+    return (2 * distinct + occurrences) / tokens ** 0.5
+
+
+def select_relevant_passages(blocks, token_budget=None, semantic=PROMPT_SELECT_SEMANTIC):
+    """
+    Pick the most risk-relevant passages from a stream of text blocks.
+
+    `blocks` are consecutive pieces of one text (e.g. iter_text_chunks
+    output). They are split into paragraphs and scored by risk-keyword
+    density (plus embedding similarity to the risk keywords when
+    `semantic`). The best passages are packed into `token_budget` tokens and
+    returned in document order as dicts with start/end character offsets
+    into the concatenated blocks, i.e. into the extracted text, not the
+    original file bytes. Only a bounded candidate pool is kept, so this
+    works on arbitrarily long streams.
+    """
+    token_budget = token_budget or PROMPT_TOKEN_BUDGET
+    budget_chars = token_budget * CHARS_PER_TOKEN
+
+    heap = []
+    offset = 0
+    for block in blocks:
+        for start, end, passage in _split_passages(block, offset):
+            # Ties go to the earlier passage, so keyword-free text degrades to "head of document"
+            item = (_keyword_score(passage), -start, end, passage)
+            if len(heap) < _MAX_CANDIDATES:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+        offset += len(block)
+
+    candidates = [
+        {"start": -neg_start, "end": end, "score": score, "text": passage}
+        for score, neg_start, end, passage in heap
+    ]
+
+    if semantic and candidates:
+        try:
+            from utils import embedding_service
+
+            vecs = embedding_service.encode([c["text"] for c in candidates], normalize=True)
+            query = embedding_service.encode(RISK_KEYWORDS, normalize=True).mean(axis=0)
+            sims = vecs @ (query / max(float((query ** 2).sum()) ** 0.5, 1e-9))
+            for c, sim in zip(candidates, sims):
+                c["score"] += 2.0 * max(float(sim), 0.0)
+        except Exception:
+            pass
+
+    # Spend no budget on irrelevant text unless nothing scored at all
+    if any(c["score"] > 0 for c in candidates):
+        candidates = [c for c in candidates if c["score"] > 0]
+
+    selected = []
+    used = 0
+    for c in sorted(candidates, key=lambda c: (-c["score"], c["start"])):
+        size = len(c["text"]) + 32  # room for the offset header
+        if used + size > budget_chars:
+            continue
+        selected.append(c)
+        used += size
+    return sorted(selected, key=lambda c: c["start"])
+
+
+def format_passages(passages):
+    """Render selected passages for the prompt, each tagged with its extracted-text range."""
+    return "\n\n".join(f"[chars {p['start']}-{p['end']}]\n{p['text']}" for p in passages)
+
+
 # ============================================================
 # ✅ MAIN (for standalone testing)
 # ============================================================
 if __name__ == "__main__":
     sample_file = "data/raw/fatf_report.txt"
     if os.path.exists(sample_file):
-        text = read_text_auto(sample_file)
-        result = extract_red_flags(text)
+        result = extract_red_flags_from_file(sample_file)
         print(json.dumps(result, indent=2))
     else:
         print("Sample file not found:", sample_file)
@@ -0,0 +1,247 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+CORPUS_DB = os.path.join("data", "corpus.db")
+
+# Flat text dumps written by the scrapers, and the source name each maps to
+KNOWN_DUMPS = {
+    "federal_reserve_press_releases.txt": "fed",
+    "dfs_press_releases_content.txt": "dfs",
+    "fincen_news.txt": "fincen",
+    "sec_press_releases.txt": "sec",
+}
+
+_NUMBERED_TITLE = re.compile(r"^==== \d+\. (.*) ====$")
+_SEPARATOR = re.compile(r"^=+$")
+_HEADER = re.compile(r"^(?:\S+ )?(Date|URL|Subtitle):\s*(.*)$")
+# Fed records list attachments between the URL and "Content:" lines
+_PREAMBLE = re.compile(r"^(?:Content:|PDF Links:|- https?://\S+)$")
+
+
+# ============================================================
+# 🗄️ STORE
+# ============================================================
+def _connect(db_path=None):
+    db_path = db_path or CORPUS_DB
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS articles (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            url TEXT UNIQUE,
+            title TEXT,
+            subtitle TEXT,
+            date TEXT,
+            body TEXT,
+            fetched_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_articles_date ON articles(date);
+        CREATE INDEX IF NOT EXISTS idx_articles_source_date ON articles(source, date);
+
+        CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+            title, body, content='articles', content_rowid='id', tokenize='porter unicode61'
+        );
+        CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+        END;
+        CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+            INSERT INTO articles_fts(articles_fts, rowid, title, body)
+            VALUES ('delete', old.id, old.title, old.body);
+        END;
+        CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN
+            INSERT INTO articles_fts(articles_fts, rowid, title, body)
+            VALUES ('delete', old.id, old.title, old.body);
+            INSERT INTO articles_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+        END;
+        """
+    )
+    return conn
+
+
+def _article_row(article):
+    return (
+        article["source"],
+        article.get("url"),
+        article.get("title"),
+        article.get("subtitle", ""),
+        article.get("date"),
+        article.get("body", ""),
+        datetime.now().isoformat(),
+    )
+
+
+_UPSERT = """
+    INSERT INTO articles (source, url, title, subtitle, date, body, fetched_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        source = excluded.source, title = excluded.title, subtitle = excluded.subtitle,
+        date = excluded.date, body = excluded.body, fetched_at = excluded.fetched_at
+"""
+
+
+def add_article(source, url, title, date, body, subtitle=""):
+    """Insert or update one article (keyed by URL); `date` is YYYY-MM-DD."""
+    article = {"source": source, "url": url, "title": title, "subtitle": subtitle, "date": date, "body": body}
+    with _connect() as conn:
+        conn.execute(_UPSERT, _article_row(article))
+
+
+def add_articles(articles, batch_size=500):
+    """Bulk upsert article dicts; returns the number written."""
+    count = 0
+    batch = []
+    with _connect() as conn:
+        for article in articles:
+            batch.append(_article_row(article))
+            if len(batch) >= batch_size:
+                conn.executemany(_UPSERT, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(_UPSERT, batch)
+            count += len(batch)
+    return count
+
+
+# ============================================================
+# 🔎 QUERY
+# ============================================================
+def match_expression(query):
+    """Turn free text into an FTS5 query of quoted terms (all must match)."""
+    terms = [t.replace('"', '""') for t in query.split()]
+    return " ".join(f'"{t}"' for t in terms)
+
+
+def search(query=None, sources=None, start_date=None, end_date=None, limit=50, raw=False):
+    """
+    Search the corpus by keyword, date range and source.
+
+    `query` is free text (every term must match) unless `raw`, in which case
+    it is passed to FTS5 as-is (phrases, OR, NEAR, prefix*). Returns dicts
+    with id, source, url, title, date and a highlighted snippet, best match
+    first (newest first without a query).
+    """
+    where, params = [], []
+    if sources:
+        where.append(f"a.source IN ({','.join('?' * len(sources))})")
+        params.extend(sources)
+    if start_date:
+        where.append("a.date >= ?")
+        params.append(str(start_date))
+    if end_date:
+        where.append("a.date <= ?")
+        params.append(str(end_date))
+
+    if query and query.strip():
+        sql = (
+            "SELECT a.id, a.source, a.url, a.title, a.date, "
+            "snippet(articles_fts, 1, '[', ']', ' … ', 24) AS snippet "
+            "FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+            "WHERE articles_fts MATCH ?"
+        )
+        params.insert(0, query if raw else match_expression(query))
+        if where:
+            sql += " AND " + " AND ".join(where)
+        sql += " ORDER BY bm25(articles_fts) LIMIT ?"
+    else:
+        sql = "SELECT a.id, a.source, a.url, a.title, a.date, substr(a.body, 1, 200) AS snippet FROM articles a"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY a.date DESC LIMIT ?"
+    params.append(limit)
+
+    with _connect() as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+def get_articles(ids):
+    """Return full articles (including body) for the given ids."""
+    if not ids:
+        return []
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM articles WHERE id IN ({','.join('?' * len(ids))}) ORDER BY date",
+            list(ids),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def list_sources():
+    """Distinct sources with article counts and date coverage."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT source, COUNT(*) AS articles, MIN(date) AS first_date, MAX(date) AS last_date "
+            "FROM articles GROUP BY source ORDER BY source"
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ============================================================
+# 📥 IMPORT OF EXISTING TEXT DUMPS
+# ============================================================
+def iter_dump_articles(path, source):
+    """
+    Parse a scraper text dump into article dicts, one record at a time.
+
+    Understands both the numbered "==== N. Title ====" layout (DFS, FinCEN)
+    and the "Title: / Date: / URL: / PDF Links: / Content:" layout (Federal
+    Reserve). Header lines before the first body line are not kept in the body.
+    """
+    current = None
+
+    def finish(rec):
+        rec["body"] = "\n".join(rec.pop("lines")).strip()
+        return rec
+
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            m = _NUMBERED_TITLE.match(line)
+            if m or line.startswith("Title: "):
+                if current:
+                    yield finish(current)
+                title = m.group(1) if m else line[len("Title: "):]
+                current = {"source": source, "title": title.strip(), "date": None, "url": None,
+                           "subtitle": "", "lines": []}
+                continue
+            if current is None:
+                continue
+            if _SEPARATOR.match(line):
+                yield finish(current)
+                current = None
+                continue
+            if not any(l.strip() for l in current["lines"]):
+                h = _HEADER.match(line)
+                if h:
+                    current[h.group(1).lower()] = h.group(2).strip()
+                    continue
+                if _PREAMBLE.match(line.strip()):
+                    continue
+            current["lines"].append(line)
+    if current:
+        yield finish(current)
+
+
+def import_dump(path, source=None):
+    """Load a scraper text dump into the corpus; returns the article count."""
+    source = source or KNOWN_DUMPS.get(os.path.basename(path), os.path.splitext(os.path.basename(path))[0])
+
+    def keyed():
+        for a in iter_dump_articles(path, source):
+            # Articles without a URL still need a stable key for upserts
+            a["url"] = a["url"] or f"{source}:{a['date']}:{a['title']}"
+            yield a
+
+    return add_articles(keyed())
+
+
+if __name__ == "__main__":
+    for name in KNOWN_DUMPS:
+        path = os.path.join("data", name)
+        if os.path.exists(path) and os.path.getsize(path):
+            print(f"📥 {path}: {import_dump(path)} articles indexed")
@@ -1,23 +1,28 @@
-import json, os
+import json, os, hashlib
 from datetime import datetime
 
-try:
-    from sentence_transformers import SentenceTransformer, util
-    sbert_model = SentenceTransformer('all-MiniLM-L6-v2')
-except Exception:
-    sbert_model = None
+import pandas as pd
+
+from utils import embedding_service
+from utils.risk_index import RISK_BUCKETS, build_risk_index
+
+TM_MODELS_PATH = os.path.join("models", "tm_models.json")
+MATCH_TYPES = ["exact", "semantic", "none"]
+LONG_COLUMNS = ["model_id", "risk_id", "match_type", "score"]
+# Buckets a phrase is matched against; not_covered_risks only records known gaps
+MATCH_BUCKETS = ("covered_risks", "partially_covered_risks")
 
 
 def load_tm_models(path=None):
     if not path:
-        path = os.path.join("models", "tm_models.json")
+        path = TM_MODELS_PATH
     with open(path, "r") as f:
         return json.load(f)
 
 
 def save_tm_models(models, path=None):
     if not path:
-        path = os.path.join("models", "tm_models.json")
+        path = TM_MODELS_PATH
 
     backup_path = path.replace(".json", f"_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
     # Create a backup before overwriting
@@ -29,13 +34,10 @@ def save_tm_models(models, path=None):
 
 
 def semantic_match(phrase, keywords, threshold=0.55):
-    if sbert_model:
+    if keywords and embedding_service.available():
         try:
-            sims = util.pytorch_cos_sim(
-                sbert_model.encode(phrase, convert_to_tensor=True),
-                sbert_model.encode(keywords, convert_to_tensor=True),
-            )
-            max_sim = float(sims.max())
+            vecs = embedding_service.encode([phrase] + list(keywords), normalize=True)
+            max_sim = float((vecs[1:] @ vecs[0]).max())
             return max_sim >= threshold, max_sim
         except Exception:
             pass
@@ -45,75 +47,236 @@ def semantic_match(phrase, keywords, threshold=0.55):
     return False, 0.0
 
 
-def assess_coverage(extracted_phrases, semantic=True, tm_model_file=None, auto_update=True):
+SEMANTIC_THRESHOLD = 0.7
+
+
+def model_key(model):
+    """Stable identifier of a TM model definition."""
+    return model.get("model_id") or model.get("model_name")
+
+
+def match_phrase(model, phrase, semantic=True, semantic_score=None, known_risks=None):
+    """
+    Classify one extracted phrase against one TM model.
+
+    Returns ("exact" | "semantic" | "none", score). `semantic_score` is a
+    precomputed best similarity for this model (e.g. from the risk index);
+    without it semantic_match runs against `known_risks`, by default the
+    model's MATCH_BUCKETS.
+    """
+    phrase_l = phrase.lower()
+
+    # Exact or partial matches
+    for kw in model.get("covered_risks", []) + model.get("partially_covered_risks", []):
+        if kw.lower() in phrase_l or phrase_l in kw.lower():
+            return "exact", 1.0
+
+    # Semantic fallback
+    if semantic:
+        if semantic_score is not None:
+            matched_flag, score = semantic_score >= SEMANTIC_THRESHOLD, semantic_score
+        else:
+            if known_risks is None:
+                known_risks = [r for b in MATCH_BUCKETS for r in model.get(b, [])]
+            matched_flag, score = semantic_match(phrase, known_risks)
+        if matched_flag and score >= SEMANTIC_THRESHOLD:
+            return "semantic", score
+
+    return "none", 0.0
+
+
+def coverage_label(n_exact, n_semantic, n_phrases):
+    """Coverage status of one model given its per-phrase match counts."""
+    if not n_phrases:
+        return "No Risks Found"
+    elif n_exact == n_phrases:
+        return "Completely Covered"
+    elif n_exact or n_semantic:
+        return "Partially Covered"
+    else:
+        return "Not Covered"
+
+# Cached RiskIndex and the fingerprint of the tm_models it was built from
+_risk_index = None
+_risk_index_sig = None
+
+
+def _models_signature(tm_models):
+    return hashlib.sha256(json.dumps(tm_models, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_risk_index(tm_models):
+    """Return a RiskIndex over `tm_models`, rebuilding only if they changed."""
+    global _risk_index, _risk_index_sig
+    sig = _models_signature(tm_models)
+    if _risk_index is None or sig != _risk_index_sig:
+        _risk_index = build_risk_index(tm_models, embedding_service.encode)
+        _risk_index_sig = sig
+    return _risk_index
+
+
+def semantic_scores_for(extracted_phrases, tm_models, index=None):
+    """
+    Best semantic score per (phrase, model_id) at or above SEMANTIC_THRESHOLD,
+    computed with one ANN query per phrase instead of one encode per model.
+    Uses the cached index over `tm_models` unless `index` is given. Only
+    MATCH_BUCKETS hits count, so a phrase never matches its own not-covered
+    entry.
+    """
+    if index is None:
+        index = get_risk_index(tm_models)
+    hits = index.query(extracted_phrases, k=10, min_score=SEMANTIC_THRESHOLD)
+    scores = {}
+    for phrase, phrase_hits in zip(extracted_phrases, hits):
+        best = scores.setdefault(phrase, {})
+        for h in phrase_hits:
+            if h.get("bucket") in MATCH_BUCKETS and h["score"] > best.get(h["model_id"], 0.0):
+                best[h["model_id"]] = h["score"]
+    return scores
+
+
+def _extend_risk_index(tm_models, new_not_covered):
+    """Insert auto-appended not_covered_risks into the cached index in place."""
+    global _risk_index_sig
+    if _risk_index is None:
+        return
+    try:
+        _risk_index.add(
+            {
+                "model_id": model_key(model),
+                "model_name": model.get("model_name"),
+                "bucket": "not_covered_risks",
+                "risk": phrase,
+            }
+            for model, phrase in new_not_covered
+        )
+        _risk_index_sig = _models_signature(tm_models)
+    except Exception:
+        # Force a full rebuild on next use rather than serve a stale index
+        _risk_index_sig = None
+
+
+def canonical_risk(text):
+    """Normalised risk key: lower-case, hyphens as spaces, single-spaced."""
+    return " ".join(str(text).lower().replace("-", " ").split())
+
+
+def build_risk_model_index(tm_models):
+    """Inverted index: canonical risk -> [{model_id, model_name, bucket}, ...]."""
+    index = {}
+    for model in tm_models:
+        for bucket in RISK_BUCKETS:
+            for risk in model.get(bucket, []):
+                index.setdefault(canonical_risk(risk), []).append(
+                    {"model_id": model_key(model), "model_name": model.get("model_name"), "bucket": bucket}
+                )
+    return index
+
+
+# Cached inverted index and the tm_models file mtime / fingerprint it reflects
+_risk_model_index = None
+_risk_model_index_sig = None
+
+
+def get_risk_model_index(tm_models=None):
+    """
+    Return the risk -> models inverted index, rebuilt only when the models
+    change (file mtime for the default tm_models.json, content otherwise).
+    """
+    global _risk_model_index, _risk_model_index_sig
+    if tm_models is None:
+        sig = ("file", os.path.getmtime(TM_MODELS_PATH))
+        if _risk_model_index is not None and sig == _risk_model_index_sig:
+            return _risk_model_index
+        tm_models = load_tm_models()
+    else:
+        sig = _models_signature(tm_models)
+    if _risk_model_index is None or sig != _risk_model_index_sig:
+        _risk_model_index = build_risk_model_index(tm_models)
+        _risk_model_index_sig = sig
+    return _risk_model_index
+
+
+def models_for_risk(risk, buckets=None, tm_models=None):
+    """
+    Models listing `risk` (e.g. "which models cover trade-based money
+    laundering"), optionally restricted to some buckets such as
+    ("covered_risks",). A dict lookup on the canonical risk key.
+    """
+    entries = get_risk_model_index(tm_models).get(canonical_risk(risk), [])
+    return [e for e in entries if not buckets or e["bucket"] in buckets]
+
+
+def coverage_long_frame(records):
+    """
+    Compact long-format coverage table from (model_id, risk, match_type, score)
+    records: categorical model_id / risk_id / match_type and float32 score,
+    so pivots and group-bys run over integer codes.
+    """
+    df = pd.DataFrame.from_records(list(records), columns=LONG_COLUMNS)
+    df["model_id"] = df["model_id"].astype("category")
+    df["risk_id"] = df["risk_id"].map(canonical_risk).astype("category")
+    df["match_type"] = pd.Categorical(df["match_type"], categories=MATCH_TYPES)
+    df["score"] = df["score"].astype("float32")
+    return df
+
+
+def assess_coverage(extracted_phrases, semantic=True, tm_model_file=None, auto_update=True, long_format=False):
     """
     Evaluate extracted FATF risks against TM models.
     Optionally auto-update tm_models.json for uncovered risks.
+    Returns one row per model, or with `long_format` a coverage_long_frame
+    with one row per (model, risk).
     """
     tm_models = load_tm_models(tm_model_file)
     updated = False
     results = []
+    cells = []
+    new_not_covered = []
+
+    semantic_scores = None
+    if semantic and extracted_phrases and embedding_service.available():
+        try:
+            semantic_scores = semantic_scores_for(extracted_phrases, tm_models)
+        except Exception:
+            semantic_scores = None
 
     for model in tm_models:
+        model_id = model_key(model)
         matched = []
         partially_matched = []
         not_covered_risks = []
 
-        all_known_risks = (
-            model.get("covered_risks", [])
-            + model.get("partially_covered_risks", [])
-            + model.get("not_covered_risks", [])
-        )
+        all_known_risks = [r for b in MATCH_BUCKETS for r in model.get(b, [])]
 
         for phrase in extracted_phrases:
-            phrase_l = phrase.lower()
-            found = False
-
-            # Exact or partial matches
-            for cat, bucket in {
-                "Covered": model.get("covered_risks", []),
-                "Partially Covered": model.get("partially_covered_risks", []),
-            }.items():
-                for kw in bucket:
-                    if kw.lower() in phrase_l or phrase_l in kw.lower():
-                        matched.append(phrase)
-                        found = True
-                        break
-                if found:
-                    break
-
-            # Semantic fallback
-            if not found and semantic:
-                matched_flag, score = semantic_match(phrase, all_known_risks)
-                if matched_flag and score >= 0.7:
-                    partially_matched.append(f"{phrase} (sim={score:.2f})")
-                    found = True
-
-            # Not covered case
-            if not found:
+            score = None
+            if semantic_scores is not None:
+                score = semantic_scores[phrase].get(model_id, 0.0)
+            match_type, score = match_phrase(
+                model, phrase, semantic=semantic, semantic_score=score, known_risks=all_known_risks
+            )
+            cells.append((model_id, phrase, match_type, score))
+
+            if match_type == "exact":
+                matched.append(phrase)
+            elif match_type == "semantic":
+                partially_matched.append(f"{phrase} (sim={score:.2f})")
+            else:
                 not_covered_risks.append(phrase)
                 # Update tm_model.json dynamically
                 if auto_update:
                     if phrase not in model.get("not_covered_risks", []):
                         model.setdefault("not_covered_risks", []).append(phrase)
+                        new_not_covered.append((model, phrase))
                         updated = True
 
-        # Assign coverage label
-        if len(matched) == len(extracted_phrases):
-            coverage = "Completely Covered"
-        elif matched or partially_matched:
-            coverage = "Partially Covered"
-        elif not extracted_phrases:
-            coverage = "No Risks Found"
-        else:
-            coverage = "Not Covered"
-
         results.append(
             {
                 "model_name": model.get("model_name"),
                 "matched_risks": ", ".join(matched + partially_matched) or "None",
                 "newly_added_not_covered": ", ".join(not_covered_risks) or "None",
-                "coverage_status": coverage,
+                "coverage_status": coverage_label(len(matched), len(partially_matched), len(extracted_phrases)),
             }
         )
 
@@ -121,5 +284,9 @@ def assess_coverage(extracted_phrases, semantic=True, tm_model_file=None, auto_u
     if auto_update and updated:
         save_tm_models(tm_models)
         print("✅ tm_models.json updated with new uncovered risks.")
+        if semantic_scores is not None:
+            _extend_risk_index(tm_models, new_not_covered)
 
+    if long_format:
+        return coverage_long_frame(cells)
     return results
@@ -0,0 +1,317 @@
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from utils import embedding_service
+from utils.coverage_mapper import (
+    MATCH_BUCKETS,
+    MATCH_TYPES,
+    coverage_label,
+    coverage_long_frame,
+    load_tm_models,
+    match_phrase,
+    model_key,
+    semantic_scores_for,
+)
+from utils.risk_index import build_risk_index
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MATRIX_DB = os.path.join("data", "processed", "coverage_matrix.db")
+REPORT_PATH = os.path.join("data", "processed", "coverage_report.csv")
+LONG_REPORT_PATH = os.path.join("data", "processed", "coverage_long.csv")
+
+# Pipeline threads and job worker processes all rewrite the same reports
+_report_lock = threading.Lock()
+
+
+# ============================================================
+# 🗄️ STORE
+# ============================================================
+def _connect(db_path=None):
+    db_path = db_path or MATRIX_DB
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            doc_id TEXT PRIMARY KEY,
+            source TEXT,
+            ingested_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS doc_phrases (
+            doc_id TEXT NOT NULL,
+            phrase TEXT NOT NULL,
+            PRIMARY KEY (doc_id, phrase)
+        );
+        CREATE TABLE IF NOT EXISTS model_versions (
+            model_id TEXT PRIMARY KEY,
+            model_name TEXT,
+            version TEXT NOT NULL,
+            mode TEXT
+        );
+        CREATE TABLE IF NOT EXISTS cells (
+            phrase TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            match_type TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (phrase, model_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_cells_model ON cells(model_id);
+        """
+    )
+    # Matrices from before scoring modes were tracked: NULL mode re-scores once
+    if "mode" not in {r[1] for r in conn.execute("PRAGMA table_info(model_versions)")}:
+        conn.execute("ALTER TABLE model_versions ADD COLUMN mode TEXT")
+    return conn
+
+
+def model_version(model):
+    """
+    Fingerprint of the parts of a model definition that affect matching.
+    not_covered_risks is left out: auto-appending a gap must not re-score
+    the model's whole column.
+    """
+    payload = {"model_name": model.get("model_name")}
+    payload.update({b: model.get(b, []) for b in MATCH_BUCKETS})
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def scoring_mode():
+    """
+    "semantic" when embeddings are available, else "exact". The whole matrix
+    is scored one way, whatever the options of the job that added a phrase,
+    and a column scored in another mode is re-scored by refresh().
+    """
+    return "semantic" if embedding_service.available() else "exact"
+
+
+def _score_cells(phrases, models, mode):
+    """Compute (phrase, model_id, match_type, score) for every phrase × model."""
+    if not phrases or not models:
+        return []
+    semantic = mode == "semantic"
+    scores = None
+    if semantic:
+        try:
+            # Index only the matchable risks of the models being scored
+            index = build_risk_index(
+                [{k: v for k, v in m.items() if k != "not_covered_risks"} for m in models],
+                embedding_service.encode,
+            )
+            scores = semantic_scores_for(phrases, models, index=index)
+        except Exception:
+            scores = None
+
+    rows = []
+    for model in models:
+        mid = model_key(model)
+        for phrase in phrases:
+            score = scores[phrase].get(mid, 0.0) if scores is not None else None
+            match_type, score = match_phrase(model, phrase, semantic=semantic, semantic_score=score)
+            rows.append((phrase, mid, match_type, float(score)))
+    return rows
+
+
+# ============================================================
+# 🔄 INCREMENTAL RE-EVALUATION
+# ============================================================
+def refresh(tm_models=None, write=True, mode=None):
+    """
+    Bring the matrix in line with the current TM models.
+
+    Only models that are new, whose version changed, or that were scored in
+    another mode (see scoring_mode) have their column recomputed across all
+    previously extracted phrases; removed models are dropped. Returns the
+    list of model ids that were re-scored.
+    """
+    tm_models = tm_models if tm_models is not None else load_tm_models()
+    mode = mode or scoring_mode()
+    current = {model_key(m): m for m in tm_models}
+
+    with _connect() as conn:
+        stored = {
+            mid: (version, stored_mode)
+            for mid, version, stored_mode in conn.execute("SELECT model_id, version, mode FROM model_versions")
+        }
+        changed = [m for mid, m in current.items() if stored.get(mid) != (model_version(m), mode)]
+        removed = [mid for mid in stored if mid not in current]
+
+        for mid in removed:
+            conn.execute("DELETE FROM cells WHERE model_id = ?", (mid,))
+            conn.execute("DELETE FROM model_versions WHERE model_id = ?", (mid,))
+
+        if changed:
+            phrases = [r[0] for r in conn.execute("SELECT DISTINCT phrase FROM doc_phrases")]
+            conn.executemany(
+                "INSERT OR REPLACE INTO cells (phrase, model_id, match_type, score) VALUES (?, ?, ?, ?)",
+                _score_cells(phrases, changed, mode),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO model_versions (model_id, model_name, version, mode) VALUES (?, ?, ?, ?)",
+                [(model_key(m), m.get("model_name"), model_version(m), mode) for m in changed],
+            )
+
+    if write and (changed or removed):
+        write_report()
+    return [model_key(m) for m in changed]
+
+
+def record_document(doc_id, phrases, source=None, tm_models=None, write=True):
+    """
+    Add one document's extracted phrases to the matrix.
+
+    Brings model columns up to date first, then scores only the phrases
+    not seen in any earlier document, and rewrites the processed report
+    unless `write` is False (bulk callers call write_report once instead).
+    """
+    tm_models = tm_models if tm_models is not None else load_tm_models()
+    mode = scoring_mode()
+    refresh(tm_models, write=False, mode=mode)
+    phrases = list(dict.fromkeys(phrases))
+
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (doc_id, source, ingested_at) VALUES (?, ?, ?)",
+            (doc_id, source or doc_id, datetime.now().isoformat()),
+        )
+        conn.execute("DELETE FROM doc_phrases WHERE doc_id = ?", (doc_id,))
+        conn.executemany(
+            "INSERT INTO doc_phrases (doc_id, phrase) VALUES (?, ?)", [(doc_id, p) for p in phrases]
+        )
+        known = {r[0] for r in conn.execute("SELECT DISTINCT phrase FROM cells")}
+        new_phrases = [p for p in phrases if p not in known]
+        conn.executemany(
+            "INSERT OR REPLACE INTO cells (phrase, model_id, match_type, score) VALUES (?, ?, ?, ?)",
+            _score_cells(new_phrases, tm_models, mode),
+        )
+
+    if write:
+        write_report()
+
+
+# ============================================================
+# 📄 REPORT
+# ============================================================
+def load_cells():
+    """Return the long-format matrix joined with documents as a DataFrame."""
+    with _connect() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT d.doc_id, d.source, dp.phrase, c.model_id, mv.model_name, c.match_type, c.score
+            FROM doc_phrases dp
+            JOIN documents d ON d.doc_id = dp.doc_id
+            JOIN cells c ON c.phrase = dp.phrase
+            JOIN model_versions mv ON mv.model_id = c.model_id
+            """,
+            conn,
+        )
+
+
+def load_long(cells=None):
+    """Matrix as a compact long-format frame: doc_id + coverage_long_frame columns."""
+    cells = load_cells() if cells is None else cells
+    df = coverage_long_frame(zip(cells["model_id"], cells["phrase"], cells["match_type"], cells["score"]))
+    df.insert(0, "doc_id", cells["doc_id"].astype("category"))
+    return df
+
+
+def read_long(path=None):
+    """Read the long-format CSV back with its categorical dtypes."""
+    path = path or LONG_REPORT_PATH
+    dtypes = {"doc_id": "category", "model_id": "category", "risk_id": "category", "score": "float32"}
+    df = pd.read_csv(path, dtype=dtypes)
+    df["match_type"] = pd.Categorical(df["match_type"], categories=MATCH_TYPES)
+    return df
+
+
+def _write_atomic(df, path):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            df.to_csv(f, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def _report_write_lock(path):
+    """Serialize report rewrites across threads and, where fcntl exists, processes."""
+    with _report_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_report(path=None, long_path=None):
+    """
+    Rewrite the per-document × model coverage report used by the dashboard,
+    plus its long-format (doc, model, risk) counterpart.
+    """
+    path = path or REPORT_PATH
+    with _report_write_lock(path):
+        _write_report(path, long_path or LONG_REPORT_PATH)
+
+
+def _write_report(path, long_path):
+    with _connect() as conn:
+        documents = conn.execute("SELECT doc_id, source FROM documents ORDER BY ingested_at").fetchall()
+        models = conn.execute("SELECT model_id, model_name FROM model_versions ORDER BY rowid").fetchall()
+    if not documents:
+        # Nothing recorded yet: keep the report that is already on disk
+        return
+
+    cells = load_cells()
+    _write_atomic(load_long(cells), long_path)
+    groups = dict(iter(cells.groupby(["doc_id", "model_id"], sort=False)))
+    rows = []
+    for (doc_id, source), (model_id, model_name) in itertools.product(documents, models):
+        # Documents without phrases have no cells but still get a row per model
+        grp = groups.get((doc_id, model_id), cells.iloc[:0])
+        exact = grp.loc[grp["match_type"] == "exact", "phrase"].tolist()
+        sem = grp[grp["match_type"] == "semantic"]
+        semantic = [f"{p} (sim={s:.2f})" for p, s in zip(sem["phrase"], sem["score"])]
+        not_covered = grp.loc[grp["match_type"] == "none", "phrase"].tolist()
+        rows.append(
+            {
+                "document": source,
+                "model_name": model_name,
+                "matched_risks": ", ".join(exact + semantic) or "None",
+                "newly_added_not_covered": ", ".join(not_covered) or "None",
+                "coverage_status": coverage_label(len(exact), len(semantic), len(grp)),
+            }
+        )
+
+    _write_atomic(
+        pd.DataFrame(
+            rows, columns=["document", "model_name", "matched_risks", "newly_added_not_covered", "coverage_status"]
+        ),
+        path,
+    )
+
+
+if __name__ == "__main__":
+    rescored = refresh()
+    print(f"✅ Coverage matrix refreshed; re-scored models: {', '.join(rescored) or 'none'}")
@@ -0,0 +1,334 @@
+"""
+Shared sentence-embedding service.
+
+Callers use `encode(texts)`. Requests from concurrent callers are collected
+into micro-batches (MAX_BATCH_SIZE / MAX_WAIT_MS) and run through one
+SentenceTransformer on CPU, behind a disk-backed LRU cache keyed by
+(model name, text).
+
+By default the service lives inside the calling process. To share one model
+across Streamlit sessions and ingestion workers, start it once with
+
+    python -m utils.embedding_service
+
+and set EMBEDDING_SERVICE_ADDR (e.g. 127.0.0.1:50515) for the clients; they
+fall back to an in-process service while the server cannot be reached
+(retried after EMBEDDING_SERVICE_RETRY_SECONDS). With the address set but no
+authkey, clients log it once and report embeddings as unavailable.
+EMBEDDING_SERVICE_AUTHKEY must be set to the same secret for the server and
+its clients: the manager protocol unpickles requests, so the key is what
+stands between the port and code execution on the server.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except Exception:
+    SentenceTransformer = None
+
+MODEL_NAME = os.getenv("SBERT_MODEL", "all-MiniLM-L6-v2")
+CACHE_DB = os.path.join("data", "cache", "embeddings.db")
+CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+SERVICE_ADDR = os.getenv("EMBEDDING_SERVICE_ADDR", "")
+SERVICE_AUTHKEY = os.getenv("EMBEDDING_SERVICE_AUTHKEY", "")
+SERVICE_RETRY_SECONDS = float(os.getenv("EMBEDDING_SERVICE_RETRY_SECONDS", "30"))
+# Cache hits refresh last_used at most this often, so reads rarely write
+CACHE_TOUCH_SECONDS = float(os.getenv("EMBEDDING_CACHE_TOUCH_SECONDS", "3600"))
+
+_local_service = None
+_local_error = None
+_local_lock = threading.Lock()
+_client = None
+_client_lock = threading.Lock()
+_client_retry_at = 0.0
+
+
+# ============================================================
+# 💾 DISK-BACKED LRU CACHE
+# ============================================================
+class EmbeddingCache:
+    """SQLite table of embeddings keyed by (model, text), evicted by last use."""
+
+    def __init__(self, path=CACHE_DB, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # Several processes share the cache; WAL lets readers run alongside a writer
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vec BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_emb_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, model, texts):
+        """Return {text: vector} for the texts present in the cache."""
+        found = {}
+        stale = []
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(texts), 500):
+                batch = texts[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text, vec, last_used FROM embeddings WHERE model = ? AND text IN ({marks})",
+                    [model, *batch],
+                ).fetchall()
+                for text, blob, last_used in rows:
+                    found[text] = np.frombuffer(blob, dtype=np.float32)
+                    if now - last_used > CACHE_TOUCH_SECONDS:
+                        stale.append(text)
+            # LRU order only needs to be roughly right; skip the write for recent hits
+            if stale:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text = ?",
+                    [(now, model, t) for t in stale],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model, items):
+        """Store {text: vector}; evicts least-recently-used rows past max_entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text, vec, last_used) VALUES (?, ?, ?, ?)",
+                [(model, t, np.asarray(v, dtype=np.float32).tobytes(), now) for t, v in items.items()],
+            )
+            self._puts_since_evict += len(items)
+            # Counting rows on every put is wasteful; check every few hundred inserts
+            if self._puts_since_evict >= 256:
+                self._puts_since_evict = 0
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+            self._conn.commit()
+
+
+# ============================================================
+# 📦 MICRO-BATCHING
+# ============================================================
+class MicroBatcher:
+    """
+    Background thread that merges concurrent encode requests into one call.
+
+    A batch is flushed when it reaches `max_batch_size` texts or when
+    `max_wait_ms` has passed since its first request arrived.
+    """
+
+    def __init__(self, encode_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """Queue `texts` for encoding; returns a Future of an (n, dim) array."""
+        fut = Future()
+        self._requests.put((list(texts), fut))
+        return fut
+
+    def _loop(self):
+        while True:
+            pending = [self._requests.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._run(pending)
+
+    def _run(self, pending):
+        unique = list(dict.fromkeys(t for texts, _ in pending for t in texts))
+        try:
+            vecs = np.asarray(self.encode_fn(unique), dtype=np.float32)
+        except Exception as e:
+            for _, fut in pending:
+                fut.set_exception(e)
+            return
+        pos = {t: i for i, t in enumerate(unique)}
+        for texts, fut in pending:
+            fut.set_result(vecs[[pos[t] for t in texts]])
+
+
+# ============================================================
+# 🧠 SERVICE
+# ============================================================
+class EmbeddingService:
+    """One shared model behind a micro-batcher and the on-disk cache."""
+
+    def __init__(self, model_name=MODEL_NAME, cache_path=CACHE_DB):
+        if SentenceTransformer is None:
+            raise RuntimeError("sentence-transformers is not installed")
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.cache = EmbeddingCache(cache_path)
+        self.batcher = MicroBatcher(
+            lambda texts: self.model.encode(texts, batch_size=MAX_BATCH_SIZE, convert_to_numpy=True)
+        )
+
+    def encode(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        found = self.cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        if missing:
+            vecs = self.batcher.submit(missing).result()
+            fresh = dict(zip(missing, vecs))
+            self.cache.put_many(self.model_name, fresh)
+            found.update(fresh)
+        return np.vstack([found[t] for t in texts])
+
+
+class _ServiceManager(BaseManager):
+    pass
+
+
+def _get_local_service():
+    global _local_service, _local_error
+    with _local_lock:
+        # Don't retry a failed model load on every call
+        if _local_error is not None:
+            raise RuntimeError(f"Embedding model unavailable: {_local_error}")
+        if _local_service is None:
+            try:
+                _local_service = EmbeddingService()
+            except Exception as e:
+                _local_error = e
+                raise
+    return _local_service
+
+
+def _require_authkey():
+    if not SERVICE_AUTHKEY:
+        raise RuntimeError(
+            "EMBEDDING_SERVICE_AUTHKEY must be set to a shared secret to use the embedding service"
+        )
+    return SERVICE_AUTHKEY.encode("utf-8")
+
+
+def _get_client():
+    """
+    Proxy to the shared service process, or None if it is not configured,
+    has no authkey, or was unreachable within the retry period.
+    """
+    global _client, _client_retry_at
+    if not SERVICE_ADDR:
+        return None
+    with _client_lock:
+        if _client is not None or time.monotonic() < _client_retry_at:
+            return _client
+        if not SERVICE_AUTHKEY:
+            print("⚠️ EMBEDDING_SERVICE_ADDR is set without EMBEDDING_SERVICE_AUTHKEY; embeddings disabled")
+            _client_retry_at = float("inf")
+            return None
+        host, port = SERVICE_ADDR.rsplit(":", 1)
+        _ServiceManager.register("get_service")
+        manager = _ServiceManager(address=(host, int(port)), authkey=SERVICE_AUTHKEY.encode("utf-8"))
+        try:
+            manager.connect()
+            _client = manager.get_service()
+        except Exception as e:
+            print(f"⚠️ Embedding service at {SERVICE_ADDR} unreachable ({e}); using the in-process model")
+            _client_retry_at = time.monotonic() + SERVICE_RETRY_SECONDS
+    return _client
+
+
+def _drop_client():
+    """Forget a client whose server went away; reconnect after the retry period."""
+    global _client, _client_retry_at
+    with _client_lock:
+        _client = None
+        _client_retry_at = time.monotonic() + SERVICE_RETRY_SECONDS
+
+
+def available():
+    """True if embeddings can be produced (shared service or local model)."""
+    if _get_client() is not None:
+        return True
+    if SERVICE_ADDR and not SERVICE_AUTHKEY:
+        return False
+    try:
+        _get_local_service()
+        return True
+    except Exception:
+        return False
+
+
+def encode(texts, normalize=False):
+    """
+    Embed a string or list of strings.
+
+    Returns a 1-D vector for a single string, else an (n, dim) float32 array.
+    """
+    single = isinstance(texts, str)
+    texts = [texts] if single else list(texts)
+
+    client = _get_client()
+    vecs = None
+    if client is not None:
+        try:
+            vecs = client.encode(texts)
+        except Exception:
+            _drop_client()
+            vecs = None
+    if vecs is None:
+        if SERVICE_ADDR:
+            _require_authkey()
+        vecs = _get_local_service().encode(texts)
+
+    if normalize and len(texts):
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vecs = vecs / norms
+    return vecs[0] if single else vecs
+
+
+def serve(address=None):
+    """Run the shared embedding service until interrupted."""
+    authkey = _require_authkey()
+    address = address or SERVICE_ADDR or "127.0.0.1:50515"
+    host, port = address.rsplit(":", 1)
+    service = EmbeddingService()
+    _ServiceManager.register("get_service", callable=lambda: service)
+    manager = _ServiceManager(address=(host, int(port)), authkey=authkey)
+    print(f"🧠 Embedding service ({service.model_name}) listening on {host}:{port}")
+    manager.get_server().serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
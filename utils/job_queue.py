@@ -0,0 +1,291 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+
+import pandas as pd
+
+JOBS_DB = os.path.join("data", "jobs.db")
+PROCESSED_DIR = os.path.join("data", "processed")
+INGESTED_DIR = os.path.join("data", "ingested")
+MAX_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# Stage name -> progress fraction shown in the UI
+STAGES = {
+    "queued": 0.0,
+    "downloading": 0.1,
+    "extracting": 0.3,
+    "assessing": 0.7,
+    "done": 1.0,
+    "failed": 1.0,
+}
+TERMINAL_STAGES = ("done", "failed")
+
+_executor = None
+_executor_lock = threading.Lock()
+_swept = False
+
+
+# ============================================================
+# 🗄️ JOB TABLE
+# ============================================================
+def _connect(db_path=None):
+    db_path = db_path or JOBS_DB
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            dedup_key TEXT NOT NULL,
+            source TEXT,
+            payload TEXT,
+            stage TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            result_path TEXT,
+            error TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs(dedup_key)")
+    try:
+        _create_live_dedup_index(conn)
+    except sqlite3.IntegrityError:
+        # Tables from before the index can hold duplicate live jobs; keep the newest
+        conn.execute(
+            "UPDATE jobs SET stage = 'failed', progress = 1.0, error = 'Superseded by a duplicate job' "
+            "WHERE stage != 'failed' AND EXISTS (SELECT 1 FROM jobs j WHERE j.dedup_key = jobs.dedup_key "
+            "AND j.stage != 'failed' AND (j.created_at, j.id) > (jobs.created_at, jobs.id))"
+        )
+        _create_live_dedup_index(conn)
+        conn.commit()
+    return conn
+
+
+def _create_live_dedup_index(conn):
+    # At most one queued/running/done job per document and options
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup_live ON jobs(dedup_key) WHERE stage != 'failed'"
+    )
+
+
+def _update_job(job_id, stage, **fields):
+    fields.update(stage=stage, progress=STAGES[stage], updated_at=datetime.now().isoformat())
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", [*fields.values(), job_id])
+
+
+def get_job(job_id):
+    """Return the job row as a dict, or None if unknown."""
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_jobs(limit=20):
+    """Return the most recently submitted jobs, newest first."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def load_job_result(job_id):
+    """Load the persisted extraction/coverage result of a finished job."""
+    job = get_job(job_id)
+    if not job or job["stage"] != "done" or not job["result_path"]:
+        return None
+    with open(job["result_path"], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ============================================================
+# ⚙️ WORKER
+# ============================================================
+def _run_ingestion_job(job_id, payload):
+    """Executed in a worker process: download/read, extract, assess, persist."""
+    # Imported here so the Streamlit process doesn't pay for them on submit
+    from utils.ai_extractor import extract_red_flags, extract_red_flags_from_file
+    from utils.coverage_mapper import assess_coverage
+    from utils.coverage_matrix import record_document
+    from utils.web_scraper import download_and_extract_pdf_text
+
+    try:
+        if payload.get("url"):
+            _update_job(job_id, "downloading")
+            text = download_and_extract_pdf_text(payload["url"])
+            safe_name = payload["source"].replace("/", "_").replace(" ", "_")[:120] + ".txt"
+            with open(os.path.join(INGESTED_DIR, safe_name), "w", encoding="utf-8") as f:
+                f.write(text or "")
+            _update_job(job_id, "extracting")
+            extraction = extract_red_flags(
+                text, use_gpt=payload.get("use_gpt"), backend=payload.get("backend")
+            )
+        else:
+            # Local files are streamed chunk by chunk, so large DOCX/XLSX/HTML stay bounded
+            _update_job(job_id, "extracting")
+            extraction = extract_red_flags_from_file(
+                payload["path"], use_gpt=payload.get("use_gpt"), backend=payload.get("backend")
+            )
+
+        _update_job(job_id, "assessing")
+        phrases = extraction.get("extracted_phrases", [])
+        # Fold the phrases into the phrase × model matrix behind the dashboard
+        # before assess_coverage appends any of them to not_covered_risks
+        record_document(job_id, phrases, source=payload["source"])
+        coverage_results = assess_coverage(phrases, semantic=payload.get("use_semantic", True))
+
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        result_path = os.path.join(PROCESSED_DIR, f"job_{job_id}.json")
+        with open(result_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"source": payload["source"], "extraction": extraction, "coverage": coverage_results},
+                f,
+                indent=2,
+            )
+        pd.DataFrame(coverage_results).to_csv(
+            os.path.join(PROCESSED_DIR, f"job_{job_id}_coverage.csv"), index=False
+        )
+        _update_job(job_id, "done", result_path=result_path)
+    except Exception as e:
+        _update_job(job_id, "failed", error=str(e))
+
+
+# ============================================================
+# 📬 SUBMISSION
+# ============================================================
+def _get_executor():
+    global _executor, _swept
+    with _executor_lock:
+        if not _swept:
+            # Jobs left mid-flight by a previous server process will never finish
+            with _connect() as conn:
+                conn.execute(
+                    "UPDATE jobs SET stage = 'failed', progress = 1.0, error = ? "
+                    "WHERE stage NOT IN ('done', 'failed')",
+                    ("Interrupted: the ingestion server restarted",),
+                )
+            _swept = True
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _discard_executor(executor):
+    """Drop a broken pool so the next submission starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _on_job_finished(job_id, executor, future):
+    # _run_ingestion_job records its own errors; an exception here means the
+    # worker process itself died (e.g. killed for running out of memory)
+    if future.cancelled():
+        error = "Cancelled: the worker pool was shut down"
+    else:
+        exc = future.exception()
+        if exc is None:
+            return
+        error = f"Worker process failed: {exc!r}"
+        if isinstance(exc, BrokenProcessPool):
+            _discard_executor(executor)
+    _update_job(job_id, "failed", error=error)
+
+
+def _submit(job_id, payload):
+    for attempt in range(2):
+        executor = _get_executor()
+        try:
+            future = executor.submit(_run_ingestion_job, job_id, payload)
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            if attempt:
+                raise
+            continue
+        future.add_done_callback(partial(_on_job_finished, job_id, executor))
+        return future
+
+
+def _dedup_key(identity, use_gpt, use_semantic, backend):
+    h = hashlib.sha256(identity)
+    h.update(f"|gpt={use_gpt}|semantic={bool(use_semantic)}|backend={backend}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def submit_ingestion_job(
+    path=None, url=None, source=None, use_gpt=None, use_semantic=True, backend=None, digest=None
+):
+    """
+    Queue an ingestion job for a local file (`path`) or a remote PDF (`url`).
+
+    `backend` selects the risk extractor (see ai_extractor.EXTRACTORS);
+    left unset, `use_gpt` or the EXTRACTOR_BACKEND env var decides.
+    `digest` is the file's SHA-256 hex digest, if the caller already has it.
+    Returns the job id. A submission matching a queued, running or finished
+    job for the same document and options is coalesced onto that job, also
+    when submitted concurrently.
+    """
+    if not path and not url:
+        raise ValueError("Either path or url is required")
+
+    if url:
+        identity = url.encode("utf-8")
+    else:
+        identity = bytes.fromhex(digest or _file_digest(path))
+    key = _dedup_key(identity, use_gpt, use_semantic, backend)
+    # Starts the pool, and on first use fails jobs orphaned by a restart, before ours exists
+    _get_executor()
+
+    with _connect() as conn:
+        # Take the write lock up front so the insert and the read-back see one state
+        conn.execute("BEGIN IMMEDIATE")
+        job_id = uuid.uuid4().hex[:12]
+        payload = {
+            "path": path,
+            "url": url,
+            "source": source or os.path.basename(path or url),
+            "use_gpt": use_gpt,
+            "use_semantic": use_semantic,
+            "backend": backend,
+        }
+        now = datetime.now().isoformat()
+        # The partial unique index makes the insert a no-op if a live job already exists
+        conn.execute(
+            "INSERT INTO jobs (id, dedup_key, source, payload, stage, progress, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'queued', 0, ?, ?) "
+            "ON CONFLICT(dedup_key) WHERE stage != 'failed' DO NOTHING",
+            (job_id, key, payload["source"], json.dumps(payload), now, now),
+        )
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE dedup_key = ? AND stage != 'failed'", (key,)
+        ).fetchone()
+    if row["id"] != job_id:
+        return row["id"]
+
+    _submit(job_id, payload)
+    return job_id
@@ -5,6 +5,9 @@ from datetime import datetime
 import time
 import os
 
+# Run from the repo root: python -m utils.news_scraper.dfs_data_scrap
+from utils.corpus_store import add_article
+
 BASE_URL = "https://www.dfs.ny.gov/reports_and_publications/press_releases/"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 OUTPUT_FILE = "dfs_press_releases_content.txt"
@@ -14,8 +17,8 @@ START_DATE = datetime.strptime("2025-09-01", "%Y-%m-%d")
 END_DATE = datetime.strptime("2025-11-05", "%Y-%m-%d")
 
 
-def get_press_release_links(max_pages=50):
-    """Collect all press release links from paginated press release listing."""
+def iter_press_release_links(max_pages=50):
+    """Yield press release links page by page as the listing is scanned."""
     all_links = set()
 
     for page in range(max_pages):
@@ -33,7 +36,9 @@ def get_press_release_links(max_pages=50):
                 href = a["href"].strip()
                 if href.startswith("/reports_and_publications/press_releases/pr"):
                     full_url = urljoin(BASE_URL, href)
-                    all_links.add(full_url)
+                    if full_url not in all_links:
+                        all_links.add(full_url)
+                        yield full_url
 
             print(f"✅ Found {len(all_links)} total links so far.")
             time.sleep(1)
@@ -42,7 +47,10 @@ def get_press_release_links(max_pages=50):
             print(f"❌ Error at {url}: {e}")
             continue
 
-    return sorted(all_links)
+
+def get_press_release_links(max_pages=50):
+    """Collect all press release links from paginated press release listing."""
+    return sorted(iter_press_release_links(max_pages))
 
 
 def extract_press_release_content(url):
@@ -92,6 +100,19 @@ def extract_press_release_content(url):
     }
 
 
+def iter_press_releases(max_pages=5):
+    """Yield in-range press releases as soon as each one is fetched."""
+    for url in iter_press_release_links(max_pages):
+        try:
+            data = extract_press_release_content(url)
+        except Exception as e:
+            print(f"⚠️ Error processing {url}: {e}")
+            continue
+        if data:
+            yield data
+        time.sleep(1)
+
+
 def main():
     os.makedirs("data", exist_ok=True)
 
@@ -107,6 +128,7 @@ def main():
                     continue
 
                 all_results.append(data)
+                add_article("dfs", data["url"], data["title"], data["date"], data["body"], subtitle=data["subtitle"])
 
                 f.write(f"==== {i}. {data['title']} ====\n")
                 f.write(f"📅 Date: {data['date']}\n")
@@ -122,7 +144,7 @@ def main():
             except Exception as e:
                 print(f"⚠️ Error processing {url}: {e}")
 
-    print(f"\n✅ All content saved to: data/{OUTPUT_FILE}")
+    print(f"\n✅ All content saved to: data/{OUTPUT_FILE} (indexed in the corpus store)")
     print(f"🗞️ Total articles extracted (in range): {len(all_results)}")
 
 
@@ -6,6 +6,9 @@ import os
 import time
 import fitz  # PyMuPDF
 
+# Run from the repo root: python -m utils.news_scraper.fincen_data_scrap
+from utils.corpus_store import add_article
+
 # === Config ===
 BASE_URL = "https://www.fincen.gov/news?page={}"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
@@ -33,30 +36,27 @@ def extract_pdf_text(pdf_url):
         return f"[⚠️ Error reading PDF {pdf_url}: {e}]"
 
 # === Step 1: Collect FinCEN news links ===
-print("🔍 Collecting FinCEN news release links...")
-all_links = set()
-
-for page in range(MAX_PAGES):
-    url = BASE_URL.format(page)
-    print(f"🌐 Visiting: {url}")
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
-        if resp.status_code != 200:
-            print(f"⚠️ Skipping {url} (Status: {resp.status_code})")
-            continue
-        soup = BeautifulSoup(resp.text, "html.parser")
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            full_url = urljoin(url, href)
-            all_links.add(full_url)
-        time.sleep(0.5)
-    except Exception as e:
-        print(f"❌ Error at {url}: {e}")
+def iter_news_release_links(max_pages=MAX_PAGES):
+    """Yield FinCEN news release links page by page as the listing is scanned."""
+    seen = set()
+    for page in range(max_pages):
+        url = BASE_URL.format(page)
+        print(f"🌐 Visiting: {url}")
+        try:
+            resp = requests.get(url, headers=HEADERS, timeout=10)
+            if resp.status_code != 200:
+                print(f"⚠️ Skipping {url} (Status: {resp.status_code})")
+                continue
+            soup = BeautifulSoup(resp.text, "html.parser")
+            for a in soup.find_all("a", href=True):
+                full_url = urljoin(url, a["href"])
+                if full_url.startswith("https://www.fincen.gov/news/news-releases/") and full_url not in seen:
+                    seen.add(full_url)
+                    yield full_url
+            time.sleep(0.5)
+        except Exception as e:
+            print(f"❌ Error at {url}: {e}")
 
-news_releases = sorted(
-    link for link in all_links if link.startswith("https://www.fincen.gov/news/news-releases/")
-)
-print(f"\n📰 Total news releases found: {len(news_releases)}\n")
 
 # === Step 2: Extract each news article ===
 def extract_fincen_content(url):
@@ -90,37 +90,66 @@ def extract_fincen_content(url):
         "pdfs": pdf_links
     }
 
-# === Step 3: Save all results in one text file ===
-os.makedirs("data", exist_ok=True)
-output_path = os.path.join("data", OUTPUT_FILE)
-
-with open(output_path, "w", encoding="utf-8") as f_out:
-    total_saved = 0
 
-    for url in news_releases:
+def iter_fincen_articles(max_pages=MAX_PAGES):
+    """
+    Yield in-range FinCEN releases as soon as each is fetched, with the text
+    of any linked PDFs. Dicts carry url/title/date (YYYY-MM-DD)/body/pdf_texts;
+    `text` is the page body followed by the PDF texts.
+    """
+    for url in iter_news_release_links(max_pages):
         try:
             data = extract_fincen_content(url)
-            rd = data["release_date"]
+        except Exception as e:
+            print(f"⚠️ Failed to scrape {url}: {e}")
+            continue
+        rd = data["release_date"]
+        if not (rd and START_DATE <= rd <= END_DATE):
+            continue
+        pdf_texts = [(pdf_url, extract_pdf_text(pdf_url)) for pdf_url in data["pdfs"]]
+        yield {
+            "url": url,
+            "title": data["title"],
+            "date": rd.strftime("%Y-%m-%d"),
+            "body": data["body"],
+            "pdf_texts": pdf_texts,
+            "text": "\n\n".join([data["body"]] + [f"📎 PDF: {u}\n{t}" for u, t in pdf_texts]),
+        }
+
+
+# === Step 3: Save all results in one text file ===
+def main():
+    print("🔍 Collecting FinCEN news release links...")
+    os.makedirs("data", exist_ok=True)
+    output_path = os.path.join("data", OUTPUT_FILE)
 
-            if rd and START_DATE <= rd <= END_DATE:
+    total_saved = 0
+    with open(output_path, "w", encoding="utf-8") as f_out:
+        for article in iter_fincen_articles():
+            # One failing article (e.g. "database is locked" on the corpus DB) must not end the crawl
+            try:
                 total_saved += 1
-                date_str = rd.strftime("%Y-%m-%d")
 
-                f_out.write(f"==== {total_saved}. {data['title']} ====\n")
-                f_out.write(f"📅 Date: {date_str}\n")
-                f_out.write(f"🔗 URL: {data['url']}\n\n")
-                f_out.write(f"{data['body']}\n\n")
+                f_out.write(f"==== {total_saved}. {article['title']} ====\n")
+                f_out.write(f"📅 Date: {article['date']}\n")
+                f_out.write(f"🔗 URL: {article['url']}\n\n")
+                f_out.write(f"{article['body']}\n\n")
 
                 # Append PDFs if present
-                for pdf_url in data["pdfs"]:
-                    pdf_text = extract_pdf_text(pdf_url)
+                for pdf_url, pdf_text in article["pdf_texts"]:
                     f_out.write(f"\n📎 PDF: {pdf_url}\n")
                     f_out.write(f"{pdf_text}\n\n")
 
+                add_article("fincen", article["url"], article["title"], article["date"], article["text"])
+
                 f_out.write("="*120 + "\n\n")
-                print(f"✅ Added: {data['title']} ({date_str})")
+                print(f"✅ Added: {article['title']} ({article['date']})")
+
+            except Exception as e:
+                print(f"⚠️ Failed to save {article['url']}: {e}")
+
+    print(f"\n✅ All done! {total_saved} articles (with PDF content) saved to: {output_path}")
 
-        except Exception as e:
-            print(f"⚠️ Failed to scrape {url}: {e}")
 
-print(f"\n✅ All done! {total_saved} articles (with PDF content) saved to: {output_path}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Streaming scrape → extract → coverage pipeline.
+
+Scraped articles flow through bounded queues into extraction workers and then
+coverage workers, so results for the first article are available while the
+crawl is still running, and a slow stage throttles the ones before it.
+
+    python -m utils.pipeline            # all sources
+    python -m utils.pipeline dfs        # one source
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+from utils.ai_extractor import extract_red_flags
+from utils.corpus_store import add_article
+from utils.coverage_mapper import assess_coverage
+from utils.coverage_matrix import record_document, write_report
+
+PROCESSED_DIR = os.path.join("data", "processed")
+CHECKPOINT_PATH = os.path.join(PROCESSED_DIR, "pipeline_checkpoint.txt")
+RESULTS_PATH = os.path.join(PROCESSED_DIR, "pipeline_results.jsonl")
+
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+EXTRACT_WORKERS = int(os.getenv("PIPELINE_EXTRACT_WORKERS", "4"))
+COVERAGE_WORKERS = int(os.getenv("PIPELINE_COVERAGE_WORKERS", "2"))
+# Rewrite the dashboard report every N assessed articles instead of after each one
+REPORT_EVERY = int(os.getenv("PIPELINE_REPORT_EVERY", "25"))
+
+_STOP = object()
+# assess_coverage(auto_update=True) rewrites tm_models.json; one writer at a time
+_tm_models_lock = threading.Lock()
+
+
+def _dfs_articles():
+    from utils.news_scraper.dfs_data_scrap import iter_press_releases
+
+    for a in iter_press_releases():
+        yield {"url": a["url"], "title": a["title"], "date": a["date"], "body": a["body"], "subtitle": a["subtitle"]}
+
+
+def _fincen_articles():
+    from utils.news_scraper.fincen_data_scrap import iter_fincen_articles
+
+    for a in iter_fincen_articles():
+        yield {"url": a["url"], "title": a["title"], "date": a["date"], "body": a["text"]}
+
+
+# Source name -> generator of article dicts (url, title, date, body)
+PRODUCERS = {
+    "dfs": _dfs_articles,
+    "fincen": _fincen_articles,
+}
+
+
+# ============================================================
+# 📌 CHECKPOINT
+# ============================================================
+class Checkpoint:
+    """Append-only record of article URLs that made it through every stage."""
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, url):
+        return url in self.done
+
+    def mark(self, url):
+        with self._lock:
+            self.done.add(url)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(url + "\n")
+
+
+# ============================================================
+# 🚰 PIPELINE
+# ============================================================
+def run_pipeline(
+    sources=None,
+    extract_workers=EXTRACT_WORKERS,
+    coverage_workers=COVERAGE_WORKERS,
+    queue_size=QUEUE_SIZE,
+    backend=None,
+    use_gpt=None,
+    semantic=True,
+    auto_update=False,
+    checkpoint_path=CHECKPOINT_PATH,
+    on_result=None,
+    report_every=REPORT_EVERY,
+):
+    """
+    Crawl `sources` and stream every new article through extraction and coverage.
+
+    Each stage has its own thread pool; queues between stages hold at most
+    `queue_size` items, so producers block when downstream falls behind.
+    Articles already in the checkpoint are skipped. Every finished article
+    is appended to RESULTS_PATH, recorded in the coverage matrix behind the
+    dashboard, and passed to `on_result` if given. The dashboard report is
+    rewritten every `report_every` articles and once at the end. Returns
+    run counters.
+    """
+    sources = list(sources or PRODUCERS)
+    unknown = [s for s in sources if s not in PRODUCERS]
+    if unknown:
+        raise ValueError(f"Unknown pipeline source(s): {', '.join(unknown)}")
+
+    checkpoint = Checkpoint(checkpoint_path)
+    articles_q = queue.Queue(maxsize=queue_size)
+    extracted_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    stats = {"fetched": 0, "skipped": 0, "extracted": 0, "assessed": 0, "errors": 0}
+    stats_lock = threading.Lock()
+    results_lock = threading.Lock()
+    started = time.monotonic()
+
+    def bump(key):
+        with stats_lock:
+            stats[key] += 1
+            return stats[key]
+
+    def refresh_report():
+        try:
+            write_report()
+        except Exception as e:
+            print(f"⚠️ Coverage report not rewritten: {e}")
+
+    def produce(source):
+        try:
+            for article in PRODUCERS[source]():
+                if stop.is_set():
+                    return
+                if article["url"] in checkpoint:
+                    bump("skipped")
+                    continue
+                try:
+                    add_article(source, article["url"], article["title"], article["date"],
+                                article["body"], subtitle=article.get("subtitle", ""))
+                except Exception as e:
+                    # The corpus index is a side output; keep the article flowing
+                    bump("errors")
+                    print(f"⚠️ Corpus store failed for {article['url']}: {e}")
+                bump("fetched")
+                articles_q.put({**article, "source": source})
+        except Exception as e:
+            bump("errors")
+            print(f"❌ Producer {source} stopped: {e}")
+
+    def extract():
+        while True:
+            article = articles_q.get()
+            if article is _STOP:
+                return
+            try:
+                extraction = extract_red_flags(article["body"] or "", use_gpt=use_gpt, backend=backend)
+                bump("extracted")
+                extracted_q.put((article, extraction))
+            except Exception as e:
+                bump("errors")
+                print(f"⚠️ Extraction failed for {article['url']}: {e}")
+
+    def assess():
+        while True:
+            item = extracted_q.get()
+            if item is _STOP:
+                return
+            article, extraction = item
+            phrases = extraction.get("extracted_phrases", [])
+            try:
+                # Score into the matrix before assess_coverage can auto-append these phrases
+                if auto_update:
+                    with _tm_models_lock:
+                        record_document(article["url"], phrases, source=article["title"], write=False)
+                        coverage = assess_coverage(phrases, semantic=semantic, auto_update=True)
+                else:
+                    record_document(article["url"], phrases, source=article["title"], write=False)
+                    coverage = assess_coverage(phrases, semantic=semantic, auto_update=False)
+
+                result = {
+                    "source": article["source"],
+                    "url": article["url"],
+                    "title": article["title"],
+                    "date": article["date"],
+                    "extracted_phrases": phrases,
+                    "coverage": coverage,
+                    "processed_at": datetime.now().isoformat(),
+                }
+                with results_lock:
+                    os.makedirs(PROCESSED_DIR, exist_ok=True)
+                    with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(result) + "\n")
+                checkpoint.mark(article["url"])
+                assessed = bump("assessed")
+                print(f"✅ [{time.monotonic() - started:6.1f}s] {article['source']}: {article['title'][:80]}")
+                if on_result:
+                    on_result(result)
+            except Exception as e:
+                bump("errors")
+                print(f"⚠️ Coverage failed for {article['url']}: {e}")
+                continue
+            if report_every and assessed % report_every == 0:
+                refresh_report()
+
+    def start(target, n, *args):
+        threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        return threads
+
+    producers = [threading.Thread(target=produce, args=(s,), daemon=True) for s in sources]
+    for t in producers:
+        t.start()
+    extractors = start(extract, max(1, extract_workers))
+    assessors = start(assess, max(1, coverage_workers))
+
+    try:
+        # Drain stage by stage: one sentinel per worker once its upstream is done
+        for t in producers:
+            t.join()
+        for _ in extractors:
+            articles_q.put(_STOP)
+        for t in extractors:
+            t.join()
+        for _ in assessors:
+            extracted_q.put(_STOP)
+        for t in assessors:
+            t.join()
+    except KeyboardInterrupt:
+        stop.set()
+        print("🛑 Interrupted; finished articles are checkpointed and will be skipped next run.")
+
+    if stats["assessed"]:
+        refresh_report()
+    stats["elapsed_s"] = round(time.monotonic() - started, 1)
+    return stats
+
+
+if __name__ == "__main__":
+    summary = run_pipeline(sys.argv[1:] or None)
+    print(f"\n📊 Pipeline finished: {summary}")
@@ -0,0 +1,177 @@
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+RISK_BUCKETS = ("covered_risks", "partially_covered_risks", "not_covered_risks")
+
+# NumPy fallback: exact search below this size, IVF (coarse k-means buckets) above
+IVF_MIN_SIZE = 4096
+IVF_NPROBE = 8
+
+
+def _normalize(vecs):
+    vecs = np.asarray(vecs, dtype=np.float32)
+    if vecs.ndim == 1:
+        vecs = vecs[None, :]
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vecs / norms
+
+
+class RiskIndex:
+    """
+    Approximate-nearest-neighbour index over TM-model risk phrases.
+
+    Each entry carries model_id / model_name / bucket / risk metadata. Uses
+    hnswlib (HNSW, cosine space) when installed, otherwise a NumPy index that
+    is exact for small inventories and switches to IVF once it grows past
+    IVF_MIN_SIZE entries. `encode` maps a list of strings to a 2-D array.
+    """
+
+    def __init__(self, encode, ef=64, M=16):
+        self.encode = encode
+        self.ef = ef
+        self.M = M
+        self.meta = []
+        self._keys = set()
+        self._hnsw = None
+        self._vecs = None
+        self._centroids = None
+        self._assign = None
+
+    def __len__(self):
+        return len(self.meta)
+
+    # --------------------------------------------------------
+    # Insertion
+    # --------------------------------------------------------
+    def add(self, entries):
+        """Add risk entries (dicts with at least `risk`); duplicates are skipped."""
+        new = []
+        for e in entries:
+            key = (e.get("model_id"), e.get("bucket"), e["risk"].lower())
+            if key not in self._keys:
+                self._keys.add(key)
+                new.append(e)
+        if not new:
+            return 0
+
+        vecs = _normalize(self.encode([e["risk"] for e in new]))
+        start = len(self.meta)
+        self.meta.extend(new)
+
+        if hnswlib is not None:
+            if self._hnsw is None:
+                self._hnsw = hnswlib.Index(space="cosine", dim=vecs.shape[1])
+                self._hnsw.init_index(max_elements=max(1024, 2 * len(new)), ef_construction=200, M=self.M)
+                self._hnsw.set_ef(self.ef)
+            needed = start + len(new)
+            if needed > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(2 * needed)
+            self._hnsw.add_items(vecs, np.arange(start, needed))
+            return len(new)
+
+        self._vecs = vecs if self._vecs is None else np.vstack([self._vecs, vecs])
+        if self._centroids is not None:
+            assign = np.argmax(vecs @ self._centroids.T, axis=1)
+            self._assign = np.concatenate([self._assign, assign])
+        elif len(self.meta) >= IVF_MIN_SIZE:
+            self._train_ivf()
+        return len(new)
+
+    def add_model(self, model):
+        """Add every risk of one TM model definition."""
+        return self.add(
+            {
+                "model_id": model.get("model_id") or model.get("model_name"),
+                "model_name": model.get("model_name"),
+                "bucket": bucket,
+                "risk": risk,
+            }
+            for bucket in RISK_BUCKETS
+            for risk in model.get(bucket, [])
+        )
+
+    def _train_ivf(self, iters=10):
+        n = len(self._vecs)
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        centroids = self._vecs[rng.choice(n, nlist, replace=False)]
+        for _ in range(iters):
+            assign = np.argmax(self._vecs @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = self._vecs[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self._centroids = centroids
+        self._assign = np.argmax(self._vecs @ centroids.T, axis=1)
+
+    # --------------------------------------------------------
+    # Search
+    # --------------------------------------------------------
+    def _search(self, qvecs, k):
+        """Return (ids, scores) arrays of shape (len(qvecs), k), best first."""
+        k = min(k, len(self.meta))
+        if self._hnsw is not None:
+            self._hnsw.set_ef(max(self.ef, k))
+            ids, dists = self._hnsw.knn_query(qvecs, k=k)
+            return ids, 1.0 - dists
+
+        if self._centroids is None:
+            sims = qvecs @ self._vecs.T
+            ids = np.argsort(-sims, axis=1)[:, :k]
+            return ids, np.take_along_axis(sims, ids, axis=1)
+
+        all_ids, all_scores = [], []
+        probe = min(IVF_NPROBE, len(self._centroids))
+        for q in qvecs:
+            lists = np.argsort(-(self._centroids @ q))[:probe]
+            cand = np.flatnonzero(np.isin(self._assign, lists))
+            sims = self._vecs[cand] @ q
+            order = np.argsort(-sims)[:k]
+            ids = np.full(k, -1)
+            scores = np.full(k, -1.0, dtype=np.float32)
+            ids[: len(order)] = cand[order]
+            scores[: len(order)] = sims[order]
+            all_ids.append(ids)
+            all_scores.append(scores)
+        return np.array(all_ids), np.array(all_scores)
+
+    def query(self, phrases, k=5, min_score=None):
+        """
+        Return the top-k risk matches for each phrase.
+
+        With `min_score`, k is widened until the k-th hit falls below the
+        threshold, so every entry scoring at or above it is returned.
+        """
+        if not phrases or not self.meta:
+            return [[] for _ in phrases]
+        qvecs = _normalize(self.encode(list(phrases)))
+
+        while True:
+            ids, scores = self._search(qvecs, k)
+            if min_score is None or k >= len(self.meta) or scores[:, -1].max() < min_score:
+                break
+            k *= 2
+
+        results = []
+        for row_ids, row_scores in zip(ids, scores):
+            hits = []
+            for i, s in zip(row_ids, row_scores):
+                if i < 0 or (min_score is not None and s < min_score):
+                    continue
+                hits.append({**self.meta[int(i)], "score": float(s)})
+            results.append(hits)
+        return results
+
+
+def build_risk_index(tm_models, encode):
+    """Build a RiskIndex over every risk bucket of every TM model."""
+    index = RiskIndex(encode)
+    for model in tm_models:
+        index.add_model(model)
+    return index